@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem
+from .models import Cart, CartItem, StockReservation
 
 
 class CartItemInline(admin.TabularInline):
@@ -22,3 +22,10 @@ class CartItemAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['cart__user__username', 'product__name']
     readonly_fields = ['subtotal']
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'product', 'quantity', 'expires_at', 'created_at']
+    list_filter = ['expires_at']
+    search_fields = ['user__username', 'product__name']
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from cart.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stock reservations in batches, returning their stock to sale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between batches')
+        parser.add_argument(
+            '--loop',
+            type=float,
+            metavar='SECONDS',
+            help='Keep running, sweeping again every SECONDS',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        while True:
+            deleted = self.sweep(options['batch_size'], options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f'Expired {deleted} stock reservations'))
+            if options['loop'] is None:
+                return
+            time.sleep(options['loop'])
+
+    def sweep(self, batch_size, sleep):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # Served by the expires_at index; short deletes keep lock times low
+            ids = list(
+                StockReservation.objects.filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            deleted += StockReservation.objects.filter(id__in=ids, expires_at__lte=now).delete()[0]
+            if sleep:
+                time.sleep(sleep)
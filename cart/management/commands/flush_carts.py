@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from cart.store import get_cart_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Write cached cart changes back to the database (CacheCartStore only). '
+        'Schedule it more often than CART_STORE_TIMEOUT so pending changes never expire.'
+    )
+
+    def handle(self, *args, **options):
+        flushed = get_cart_store().flush_all()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} carts'))
@@ -0,0 +1,92 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef, Q
+from django.utils import timezone
+from cart.models import Cart, CartItem
+from cart.store import get_cart_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete empty and abandoned carts in small primary-key ranges, pausing '
+        'between batches so a live database is never locked for long.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--empty-days',
+            type=int,
+            default=7,
+            help='Delete carts without items untouched for this many days',
+        )
+        parser.add_argument(
+            '--idle-days',
+            type=int,
+            default=60,
+            help='Delete carts (with their items) untouched for this many days',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Cart ids per range')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+        if options['empty_days'] < 0 or options['idle_days'] < 0:
+            raise CommandError('Age thresholds cannot be negative')
+
+        now = timezone.now()
+        empty_before = now - timedelta(days=options['empty_days'])
+        idle_before = now - timedelta(days=options['idle_days'])
+        # Item changes do not touch Cart.updated_at, so check the items too
+        stale = (
+            Q(updated_at__lt=empty_before) & ~Exists(CartItem.objects.filter(cart=OuterRef('pk')))
+        ) | (
+            Q(updated_at__lt=idle_before)
+            & ~Exists(CartItem.objects.filter(cart=OuterRef('pk'), updated_at__gte=idle_before))
+        )
+
+        bounds = Cart.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No carts')
+            return
+
+        store = get_cart_store()
+        started = time.monotonic()
+        carts = items = batches = 0
+        for start in range(bounds['low'], bounds['high'] + 1, options['batch_size']):
+            batch = Cart.objects.filter(pk__gte=start, pk__lt=start + options['batch_size']).filter(stale)
+            if options['dry_run']:
+                carts += batch.count()
+                items += CartItem.objects.filter(cart__in=batch).count()
+            else:
+                with transaction.atomic():
+                    rows = list(batch.values_list('pk', 'user_id'))
+                    if rows:
+                        deleted = Cart.objects.filter(pk__in=[pk for pk, _ in rows]).filter(stale).delete()[1]
+                        carts += deleted.get(Cart._meta.label, 0)
+                        items += deleted.get(CartItem._meta.label, 0)
+                if rows:
+                    store.invalidate_users([user_id for _, user_id in rows])
+
+            batches += 1
+            if batches % 50 == 0:
+                self.report(start + options['batch_size'] - 1, bounds['high'], carts, items, started)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {carts} carts and {items} cart items in {batches} batches ({elapsed:.1f}s)'
+        ))
+
+    def report(self, position, high, carts, items, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Up to cart id {position}/{high}: {carts} carts, {items} items deleted '
+            f'({carts / elapsed if elapsed else 0:.0f} carts/s)'
+        )
@@ -53,3 +53,30 @@ class CartItem(models.Model):
         verbose_name = 'Cart Item'
         verbose_name_plural = 'Cart Items'
         unique_together = ['cart', 'product']
+
+
+class StockReservation(models.Model):
+    """Time-limited hold on product stock for an item in a user's cart"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for {self.user_id}"
+
+    class Meta:
+        db_table = 'stock_reservations'
+        verbose_name = 'Stock Reservation'
+        verbose_name_plural = 'Stock Reservations'
+        unique_together = ['user', 'product']
+        indexes = [
+            # Active holds per product (available stock) and the expiry sweep
+            models.Index(fields=['product', 'expires_at'], name='reservations_product_idx'),
+            models.Index(fields=['expires_at'], name='reservations_expiry_idx'),
+        ]
@@ -0,0 +1,104 @@
+"""
+Time-limited stock holds for cart items.
+
+Every cart change sets the user's StockReservation for that product to the
+cart quantity, valid for STOCK_RESERVATION_TTL seconds from the last change.
+Stock available to a user is `stock - active holds of other users`. Callers
+lock the product rows with `lock_stock()` first, so concurrent holds on the
+same product are serialized. Checkout turns the user's holds into stock
+decrements; `manage.py expire_reservations` deletes expired holds.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Sum, Value, When
+from django.utils import timezone
+from products.models import Product
+from .models import StockReservation
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def lock_stock(product_ids):
+    """Lock the products (in id order, to avoid deadlocks) and return {id: stock}"""
+    return dict(
+        Product.objects.select_for_update()
+        .filter(id__in=product_ids)
+        .order_by('id')
+        .values_list('id', 'stock')
+    )
+
+
+def active(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_by_others(user, product_ids):
+    """Quantities held by other users' active reservations, as {product_id: quantity}"""
+    return dict(
+        active()
+        .filter(product_id__in=product_ids)
+        .exclude(user=user)
+        .values('product_id')
+        .annotate(held=Sum('quantity'))
+        .values_list('product_id', 'held')
+    )
+
+
+def available_for(user, stock):
+    """Stock each product in `stock` ({id: stock}) still has for `user`"""
+    held = held_by_others(user, list(stock))
+    return {product_id: quantity - held.get(product_id, 0) for product_id, quantity in stock.items()}
+
+
+def reserve(user, quantities):
+    """
+    Set the user's holds to `quantities` ({product_id: quantity}, 0 releases)
+    and restart their TTL. Availability is checked by the caller.
+    """
+    released = [product_id for product_id, quantity in quantities.items() if not quantity]
+    if released:
+        release(user, released)
+
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    holds = [
+        StockReservation(user=user, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items() if quantity
+    ]
+    if holds:
+        StockReservation.objects.bulk_create(
+            holds,
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+
+
+def release(user, product_ids=None):
+    holds = StockReservation.objects.filter(user=user)
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=product_ids)
+    holds.delete()
+
+
+def refresh(user_id, quantities):
+    """
+    Set the user's active holds to `quantities` ({product_id: quantity}) and
+    restart their TTL, in one UPDATE. Availability is not checked, so only use
+    it for quantities the holds already cover; expired holds are left alone.
+    """
+    now = timezone.now()
+    active(now).filter(user_id=user_id, product_id__in=list(quantities)).update(
+        quantity=Case(
+            *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+            output_field=IntegerField(),
+        ),
+        expires_at=now + timedelta(seconds=settings.STOCK_RESERVATION_TTL),
+    )
+
+
+def held_by(user, product_ids):
+    """The user's own active holds, as {product_id: quantity}"""
+    return dict(active().filter(user=user, product_id__in=product_ids).values_list('product_id', 'quantity'))
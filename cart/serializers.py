@@ -1,11 +1,12 @@
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from .models import Cart, CartItem
-from products.serializers import ProductSerializer
+from products.serializers import ProductDetailsField, SparseFieldsetMixin
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for CartItem model"""
-    product_details = ProductSerializer(source='product', read_only=True)
+    product_details = ProductDetailsField(source='product')
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
@@ -19,7 +20,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         return value
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Cart model"""
     items = CartItemSerializer(many=True, read_only=True)
     total_items = serializers.IntegerField(read_only=True)
@@ -30,6 +31,17 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'items', 'total_items', 'total_price', 'created_at', 'updated_at']
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
 
+    def to_representation(self, instance):
+        # Load items with their products and categories in one go; `items`,
+        # `total_items` and `total_price` all read the prefetched rows.
+        needs_items = {'items', 'total_items', 'total_price'} & set(self.fields)
+        if needs_items and 'items' not in getattr(instance, '_prefetched_objects_cache', {}):
+            prefetch_related_objects(
+                [instance],
+                Prefetch('items', queryset=CartItem.objects.select_related('product__category')),
+            )
+        return super().to_representation(instance)
+
 
 class AddToCartSerializer(serializers.Serializer):
     """Serializer for adding items to cart"""
@@ -44,7 +56,8 @@ class AddToCartSerializer(serializers.Serializer):
     def validate_product_id(self, value):
         from products.models import Product
         try:
-            Product.objects.get(id=value)
+            # Kept for the view so the product is only fetched once
+            self.product = Product.objects.only('id', 'stock').get(id=value)
         except Product.DoesNotExist:
             raise serializers.ValidationError("Product not found")
         return value
@@ -63,7 +76,25 @@ class UpdateCartItemSerializer(serializers.Serializer):
     def validate_product_id(self, value):
         from products.models import Product
         try:
-            Product.objects.get(id=value)
+            # Kept for the view so the product is only fetched once
+            self.product = Product.objects.only('id', 'stock').get(id=value)
         except Product.DoesNotExist:
             raise serializers.ValidationError("Product not found")
         return value
+
+
+class CartBatchOperationSerializer(serializers.Serializer):
+    """One operation of a cart batch: set `quantity` or apply `delta` to a product"""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(required=False)
+    delta = serializers.IntegerField(required=False)
+
+    def validate_quantity(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Quantity cannot be negative")
+        return value
+
+    def validate(self, attrs):
+        if ('quantity' in attrs) == ('delta' in attrs):
+            raise serializers.ValidationError("Provide either quantity or delta")
+        return attrs
@@ -0,0 +1,397 @@
+"""
+Cart storage backends used by the cart views.
+
+`DatabaseCartStore` (the default) reads and writes Cart/CartItem directly.
+`CacheCartStore` keeps each working cart in the Django cache: quantity
+changes only touch the cached copy and are written back in bulk once they
+are older than CART_STORE_FLUSH_INTERVAL, or whenever the cart must be
+consistent in the database (checkout, batch edits, clearing). Adding a new
+product or removing one still writes through, so every item keeps a real id.
+Stock holds are taken in blocks of CART_STORE_HOLD_BLOCK units and tracked in
+the cached cart, so only growing past the held block (or outliving the hold)
+reaches the database; write-back trims the holds to the real quantities and
+restarts their TTL.
+Carts with pending changes are also registered so `manage.py flush_carts`
+can write them back periodically; run it more often than CART_STORE_TIMEOUT.
+
+Select the backend with the CART_STORE setting. CacheCartStore needs a cache
+shared by all workers (Redis/Memcached); LocMemCache is only safe with a
+single worker process.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from products.models import Product
+from . import reservations
+from .models import Cart, CartItem
+from .reservations import InsufficientStock
+
+# Cache key holding the ids of users whose cached cart has unflushed changes
+DIRTY_KEY = 'cart:dirty'
+
+
+class CartBusy(APIException):
+    """Another request holds the cart lock for too long"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The cart is being updated, please retry'
+    default_code = 'cart_busy'
+
+
+class DatabaseCartStore:
+    """Carts live in Cart/CartItem only"""
+
+    def get_cart(self, user):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        return cart
+
+    def add_item(self, user, product, quantity):
+        """Add `quantity` of `product` (loaded with its stock) to the user's cart"""
+        if product.stock < quantity:
+            raise InsufficientStock
+
+        with transaction.atomic():
+            stock = reservations.lock_stock([product.pk])
+            # The cart and the product's current quantity in it, in one query
+            cart = Cart.objects.filter(user=user).annotate(
+                current_quantity=Subquery(
+                    CartItem.objects.filter(cart=OuterRef('pk'), product=product).values('quantity')[:1]
+                )
+            ).first()
+            if cart is None:
+                cart, _ = Cart.objects.get_or_create(user=user)
+            current = getattr(cart, 'current_quantity', None)
+            self.hold(user, stock, product.pk, (current or 0) + quantity)
+
+            # The quantity read above picks the statement; the fallbacks only run
+            # if the item was added or removed concurrently since that read.
+            if current is None or not self.increment_quantity(cart, product, quantity):
+                try:
+                    with transaction.atomic():
+                        CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+                except IntegrityError:
+                    # Zero rows means the combined quantity exceeds the stock
+                    if not self.increment_quantity(cart, product, quantity):
+                        raise InsufficientStock
+        return cart
+
+    @staticmethod
+    def hold(user, stock, product_id, quantity):
+        """
+        Reserve `quantity` of a product locked with `reservations.lock_stock`
+        for the user, if that much is not held by others.
+        """
+        if quantity > reservations.available_for(user, stock).get(product_id, 0):
+            raise InsufficientStock
+        reservations.reserve(user, {product_id: quantity})
+
+    @staticmethod
+    def increment_quantity(cart, product, quantity):
+        """
+        Add to an existing cart item in one conditional UPDATE, so concurrent
+        adds cannot lose updates or push the quantity past the stock.
+        """
+        return CartItem.objects.filter(
+            cart=cart,
+            product=product,
+            product__stock__gte=F('quantity') + quantity,
+        ).update(quantity=F('quantity') + quantity, updated_at=timezone.now())
+
+    def update_item(self, user, product, quantity):
+        """
+        Set the quantity of a product already in the cart; 0 removes it.
+        Raises Cart.DoesNotExist / CartItem.DoesNotExist when missing.
+        """
+        cart = Cart.objects.get(user=user)
+        cart_item = CartItem.objects.get(cart=cart, product_id=product.pk)
+        if quantity == 0:
+            cart_item.delete()
+            reservations.release(user, [product.pk])
+            return cart
+        if product.stock < quantity:
+            raise InsufficientStock
+        with transaction.atomic():
+            self.hold(user, reservations.lock_stock([product.pk]), product.pk, quantity)
+            cart_item.quantity = quantity
+            cart_item.save(update_fields=['quantity', 'updated_at'])
+        return cart
+
+    def flush(self, user):
+        """Write pending changes so Cart/CartItem reflect the current cart"""
+
+    def flush_all(self):
+        """Write back every cart with pending changes; returns how many"""
+        return 0
+
+    def invalidate(self, user):
+        """Forget any copy of the cart held outside the database"""
+
+    def invalidate_users(self, user_ids):
+        """Forget the carts of many users, e.g. after deleting them in bulk"""
+
+
+class CacheCartStore(DatabaseCartStore):
+    """Working carts in the cache, with write-behind for quantity changes"""
+
+    def __init__(self):
+        self.cache = caches[settings.CART_STORE_CACHE]
+        self.timeout = settings.CART_STORE_TIMEOUT
+        self.flush_interval = settings.CART_STORE_FLUSH_INTERVAL
+        self.lock_timeout = settings.CART_STORE_LOCK_TIMEOUT
+        self.hold_block = max(settings.CART_STORE_HOLD_BLOCK, 1)
+
+    def get_cart(self, user):
+        with self.lock(user):
+            entry = self.load(user)
+            self.flush_if_due(entry)
+            self.save(user, entry)
+        return self.build_cart(user, entry)
+
+    def add_item(self, user, product, quantity):
+        if product.stock < quantity:
+            raise InsufficientStock
+        with self.lock(user):
+            entry = self.load(user)
+            created = False
+            if product.pk not in entry['items']:
+                self.ensure_hold(user, entry, product, quantity)
+                created = self.create_item(entry, product, quantity)
+                if not created:
+                    # The cart changed behind the cache's back; resync and retry
+                    self.write_back(entry)
+                    self.invalidate(user)
+                    entry = self.load(user)
+                    created = product.pk not in entry['items'] and self.create_item(entry, product, quantity)
+            if not created:
+                new_quantity = entry['items'][product.pk]['quantity'] + quantity
+                if product.stock < new_quantity:
+                    raise InsufficientStock
+                self.ensure_hold(user, entry, product, new_quantity)
+                self.set_quantity(entry, product.pk, new_quantity)
+            self.flush_if_due(entry)
+            self.save(user, entry)
+        return self.build_cart(user, entry)
+
+    def update_item(self, user, product, quantity):
+        with self.lock(user):
+            entry = self.load(user, create=False)
+            if entry is None:
+                raise Cart.DoesNotExist
+            item = entry['items'].get(product.pk)
+            if item is None:
+                raise CartItem.DoesNotExist
+            if quantity == 0:
+                CartItem.objects.filter(pk=item['id']).delete()
+                reservations.release(user, [product.pk])
+                del entry['items'][product.pk]
+                entry['dirty'].discard(product.pk)
+                entry.setdefault('holds', {}).pop(product.pk, None)
+            elif product.stock < quantity:
+                raise InsufficientStock
+            else:
+                self.ensure_hold(user, entry, product, quantity)
+                self.set_quantity(entry, product.pk, quantity)
+            self.flush_if_due(entry)
+            self.save(user, entry)
+        return self.build_cart(user, entry)
+
+    def ensure_hold(self, user, entry, product, quantity):
+        """
+        Make sure the user holds at least `quantity` of the product. Within an
+        unexpired hold recorded in the entry this is free; otherwise reserve
+        the quantity rounded up to the next block, while a block more stays
+        available to others, so the next few taps stay in the cache.
+        """
+        holds = entry.setdefault('holds', {})
+        held = holds.get(product.pk)
+        if held is not None and quantity <= held[0] and time.time() < held[1]:
+            return
+
+        # Recorded before the upsert, so it never outlives the stored hold
+        expires_at = time.time() + settings.STOCK_RESERVATION_TTL
+        with transaction.atomic():
+            stock = reservations.lock_stock([product.pk])
+            available = reservations.available_for(user, stock).get(product.pk, 0)
+            if quantity > available:
+                raise InsufficientStock
+            block = -(-quantity // self.hold_block) * self.hold_block
+            # Scarce stock is held exactly, so a block never keeps the last
+            # units from other carts
+            hold = block if available - block >= self.hold_block else quantity
+            reservations.reserve(user, {product.pk: hold})
+        holds[product.pk] = (hold, expires_at)
+
+    def create_item(self, entry, product, quantity):
+        """Insert a new cart item (write-through); False if it already exists"""
+        try:
+            with transaction.atomic():
+                cart_item = CartItem.objects.create(cart_id=entry['cart_id'], product=product, quantity=quantity)
+        except IntegrityError:
+            return False
+        entry['items'][product.pk] = self.item_entry(cart_item)
+        return True
+
+    def flush(self, user):
+        self.flush_user(user.pk)
+
+    def flush_user(self, user_id):
+        with self.lock(user_id):
+            entry = self.cache.get(self.key(user_id))
+            if entry is not None and entry['dirty']:
+                self.write_back(entry)
+                self.cache.set(self.key(user_id), entry, timeout=self.timeout)
+
+    def flush_all(self):
+        with _CacheLock(self.cache, f'{DIRTY_KEY}:lock', self.lock_timeout):
+            user_ids = self.cache.get(DIRTY_KEY) or set()
+            self.cache.delete(DIRTY_KEY)
+        for user_id in user_ids:
+            self.flush_user(user_id)
+        return len(user_ids)
+
+    def invalidate(self, user):
+        self.cache.delete(self.key(user.pk))
+
+    def invalidate_users(self, user_ids):
+        self.cache.delete_many([self.key(user_id) for user_id in user_ids])
+
+    # Cache entry handling
+
+    def key(self, user_id):
+        return f'cart:{user_id}'
+
+    def load(self, user, create=True):
+        entry = self.cache.get(self.key(user.pk))
+        if entry is not None:
+            return entry
+
+        if create:
+            cart, _ = Cart.objects.get_or_create(user=user)
+        else:
+            cart = Cart.objects.filter(user=user).first()
+            if cart is None:
+                return None
+        return {
+            'cart_id': cart.pk,
+            'user_id': user.pk,
+            'created_at': cart.created_at,
+            'updated_at': cart.updated_at,
+            'items': {item.product_id: self.item_entry(item) for item in cart.items.all()},
+            'dirty': set(),
+            'dirty_since': None,
+            'registered': False,
+        }
+
+    def save(self, user, entry):
+        if entry['dirty'] and not entry['registered']:
+            with _CacheLock(self.cache, f'{DIRTY_KEY}:lock', self.lock_timeout):
+                user_ids = self.cache.get(DIRTY_KEY) or set()
+                user_ids.add(user.pk)
+                self.cache.set(DIRTY_KEY, user_ids, timeout=None)
+            entry['registered'] = True
+        self.cache.set(self.key(user.pk), entry, timeout=self.timeout)
+
+    @staticmethod
+    def item_entry(item):
+        return {
+            'id': item.pk,
+            'quantity': item.quantity,
+            'created_at': item.created_at,
+            'updated_at': item.updated_at,
+        }
+
+    @staticmethod
+    def set_quantity(entry, product_id, quantity):
+        item = entry['items'][product_id]
+        item['quantity'] = quantity
+        item['updated_at'] = timezone.now()
+        entry['dirty'].add(product_id)
+        if entry['dirty_since'] is None:
+            entry['dirty_since'] = time.time()
+
+    def flush_if_due(self, entry):
+        if entry['dirty'] and time.time() - entry['dirty_since'] >= self.flush_interval:
+            self.write_back(entry)
+
+    def write_back(self, entry):
+        items = [
+            CartItem(
+                pk=entry['items'][product_id]['id'],
+                quantity=entry['items'][product_id]['quantity'],
+                updated_at=entry['items'][product_id]['updated_at'],
+            )
+            for product_id in entry['dirty'] if product_id in entry['items']
+        ]
+        CartItem.objects.bulk_update(items, ['quantity', 'updated_at'])
+
+        # Give back the unused part of the held blocks and restart the TTL of
+        # the holds, as a change through DatabaseCartStore would
+        now = time.time()
+        holds = entry.get('holds', {})
+        refreshed = {
+            product_id: entry['items'][product_id]['quantity']
+            for product_id in entry['dirty']
+            if product_id in entry['items'] and product_id in holds and now < holds[product_id][1]
+        }
+        if refreshed and 'user_id' in entry:
+            reservations.refresh(entry['user_id'], refreshed)
+            expires_at = now + settings.STOCK_RESERVATION_TTL
+            for product_id, quantity in refreshed.items():
+                holds[product_id] = (quantity, expires_at)
+
+        entry['dirty'] = set()
+        entry['dirty_since'] = None
+        entry['registered'] = False
+
+    def build_cart(self, user, entry):
+        """Cart instance with its items prefetched from the entry, ready for CartSerializer"""
+        cart = Cart(id=entry['cart_id'], user=user, created_at=entry['created_at'], updated_at=entry['updated_at'])
+        products = Product.objects.select_related('category').in_bulk(list(entry['items']))
+        items = [
+            CartItem(cart=cart, product=products[product_id], **item)
+            for product_id, item in entry['items'].items()
+            # Deleted products take their cart items with them
+            if product_id in products
+        ]
+        queryset = cart.items.all()
+        queryset._result_cache = items
+        queryset._prefetch_done = True
+        cart._prefetched_objects_cache = {'items': queryset}
+        return cart
+
+    def lock(self, user_or_id):
+        user_id = getattr(user_or_id, 'pk', user_or_id)
+        return _CacheLock(self.cache, f'{self.key(user_id)}:lock', self.lock_timeout)
+
+
+class _CacheLock:
+    def __init__(self, cache, key, timeout):
+        self.cache = cache
+        self.key = key
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while not self.cache.add(self.key, 1, timeout=self.timeout):
+            if time.monotonic() >= deadline:
+                raise CartBusy
+            time.sleep(0.01)
+
+    def __exit__(self, *exc_info):
+        self.cache.delete(self.key)
+
+
+_store = None
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.CART_STORE)()
+    return _store
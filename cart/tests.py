@@ -0,0 +1,171 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from products.models import Category, Product
+from .models import Cart, CartItem, StockReservation
+from .reservations import InsufficientStock
+from .store import CacheCartStore, DatabaseCartStore
+
+
+class DatabaseCartStoreAddItemTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.product = Product.objects.create(name='Milk', description='1 litre', price=10, stock=10)
+        Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.store = DatabaseCartStore()
+
+    def test_first_add_inserts_the_item(self):
+        # Transaction start/end, lock, cart + quantity, others' holds, hold upsert,
+        # and the insert in its own savepoint
+        with self.assertNumQueries(9):
+            self.store.add_item(self.user, self.product, 2)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 2)
+
+    def test_repeat_add_updates_the_item(self):
+        self.store.add_item(self.user, self.product, 2)
+        # Transaction start/end, lock, cart + quantity, others' holds, hold upsert, update
+        with self.assertNumQueries(7):
+            self.store.add_item(self.user, self.product, 3)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 5)
+
+    def test_add_beyond_stock_is_refused(self):
+        self.store.add_item(self.user, self.product, 8)
+        with self.assertRaises(InsufficientStock):
+            self.store.add_item(self.user, self.product, 3)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 8)
+
+
+@override_settings(CART_STORE_HOLD_BLOCK=5)
+class CacheCartStoreHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'password')
+        cls.product = Product.objects.create(name='Milk', description='1 litre', price=10, stock=12)
+
+    def setUp(self):
+        self.store = CacheCartStore()
+        self.store.cache.clear()
+        self.addCleanup(self.store.cache.clear)
+
+    def held(self, user):
+        holds = StockReservation.objects.filter(user=user, product=self.product)
+        return holds.values_list('quantity', flat=True).first()
+
+    def test_changes_within_the_held_block_stay_in_the_cache(self):
+        store = self.store
+        store.add_item(self.user, self.product, 1)
+        self.assertEqual(self.held(self.user), 5)
+
+        # Only build_cart reloads the products
+        with self.assertNumQueries(1):
+            store.add_item(self.user, self.product, 1)
+        with self.assertNumQueries(1):
+            store.update_item(self.user, self.product, 5)
+        self.assertEqual(self.held(self.user), 5)
+
+    def test_growing_past_the_block_holds_the_next_one_while_stock_is_plentiful(self):
+        store = self.store
+        store.add_item(self.user, self.product, 1)
+        store.update_item(self.user, self.product, 6)
+        # 12 in stock: a block of 10 would leave less than a block, hold exactly
+        self.assertEqual(self.held(self.user), 6)
+
+        Product.objects.filter(pk=self.product.pk).update(stock=20)
+        store.update_item(self.user, self.product, 7)
+        self.assertEqual(self.held(self.user), 10)
+
+    def test_flush_gives_back_the_unused_part_of_the_block(self):
+        store = self.store
+        store.add_item(self.user, self.product, 1)
+        store.update_item(self.user, self.product, 2)
+        store.flush(self.user)
+
+        self.assertEqual(self.held(self.user), 2)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 2)
+
+    def test_held_blocks_are_not_available_to_others(self):
+        store = self.store
+        store.add_item(self.user, self.product, 1)
+        with self.assertRaises(InsufficientStock):
+            store.add_item(self.other, self.product, 8)
+        store.add_item(self.other, self.product, 7)
+
+
+class ConcurrentAddItemTests(TransactionTestCase):
+    def test_concurrent_adds_neither_lose_updates_nor_exceed_stock(self):
+        user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        product = Product.objects.create(name='Milk', description='1 litre', price=10, stock=5)
+        store = DatabaseCartStore()
+        outcomes = []
+        start = threading.Barrier(8)
+
+        def add():
+            start.wait()
+            try:
+                while True:
+                    try:
+                        store.add_item(user, product, 1)
+                        outcomes.append('added')
+                        return
+                    except InsufficientStock:
+                        outcomes.append('refused')
+                        return
+                    except OperationalError:
+                        # SQLite has no row locks and rejects concurrent writers
+                        continue
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('added'), 5)
+        self.assertEqual(outcomes.count('refused'), 3)
+        self.assertEqual(CartItem.objects.get(cart__user=user).quantity, 5)
+
+
+class CartSerializerQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Dairy')
+        cls.small = Cart.objects.create(user=User.objects.create_user('small', 'small@example.com', 'password'))
+        cls.large = Cart.objects.create(user=User.objects.create_user('large', 'large@example.com', 'password'))
+        for cart, count in ((cls.small, 1), (cls.large, 30)):
+            for i in range(count):
+                product = Product.objects.create(
+                    name=f'{cart.user.username} {i}',
+                    description='Item',
+                    price=10,
+                    stock=50,
+                    category=cls.category if i % 2 else None,
+                )
+                CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+    def render(self, cart):
+        client = APIClient()
+        client.force_authenticate(cart.user)
+        # The cart, then its items with their products and categories
+        with self.assertNumQueries(2):
+            response = client.get(reverse('cart:get'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        small = self.render(self.small)
+        large = self.render(self.large)
+
+        self.assertEqual(small['total_items'], 2)
+        self.assertEqual(large['total_items'], 60)
+        self.assertEqual(len(large['items']), 30)
+        self.assertEqual(large['items'][1]['product_details']['category_name'], 'Dairy')
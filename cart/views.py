@@ -2,13 +2,16 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from .models import Cart, CartItem
-from products.models import Product
+from . import reservations
+from .store import InsufficientStock, get_cart_store
 from .serializers import (
     CartSerializer, 
     AddToCartSerializer, 
-    UpdateCartItemSerializer
+    UpdateCartItemSerializer,
+    CartBatchOperationSerializer
 )
 
 
@@ -21,40 +24,17 @@ class AddToCartView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        product_id = serializer.validated_data['product_id']
-        quantity = serializer.validated_data['quantity']
-
-        product = get_object_or_404(Product, id=product_id)
-
-        # Check stock availability
-        if product.stock < quantity:
+        try:
+            cart = get_cart_store().add_item(
+                request.user, serializer.product, serializer.validated_data['quantity']
+            )
+        except InsufficientStock:
             return Response(
                 {'error': 'Insufficient stock available'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Get or create cart for user
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-
-        # Get or create cart item
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            # Update quantity if item already exists
-            new_quantity = cart_item.quantity + quantity
-            if product.stock < new_quantity:
-                return Response(
-                    {'error': 'Insufficient stock available'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart_item.quantity = new_quantity
-            cart_item.save()
-
-        cart_serializer = CartSerializer(cart)
+        cart_serializer = CartSerializer(cart, context={'request': request})
         return Response(cart_serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -67,39 +47,125 @@ class UpdateCartView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        product_id = serializer.validated_data['product_id']
-        quantity = serializer.validated_data['quantity']
-
         try:
-            cart = Cart.objects.get(user=request.user)
+            # A quantity of 0 removes the item
+            cart = get_cart_store().update_item(
+                request.user, serializer.product, serializer.validated_data['quantity']
+            )
         except Cart.DoesNotExist:
             return Response(
                 {'error': 'Cart not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
-
-        try:
-            cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
         except CartItem.DoesNotExist:
             return Response(
                 {'error': 'Product not found in cart'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except InsufficientStock:
+            return Response(
+                {'error': 'Insufficient stock available'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        if quantity == 0:
-            # Remove item if quantity is 0
-            cart_item.delete()
-        else:
-            # Check stock availability
-            if cart_item.product.stock < quantity:
-                return Response(
-                    {'error': 'Insufficient stock available'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart_item.quantity = quantity
-            cart_item.save()
-
-        cart_serializer = CartSerializer(cart)
+        cart_serializer = CartSerializer(cart, context={'request': request})
+        return Response(cart_serializer.data, status=status.HTTP_200_OK)
+
+
+class CartBatchView(APIView):
+    """Apply many cart item changes in one request"""
+    permission_classes = [IsAuthenticated]
+    max_operations = 200
+
+    def post(self, request):
+        """
+        Body is a list of {product_id, quantity | delta} operations, applied
+        in order and all-or-nothing. quantity 0 (or a delta down to 0)
+        removes the item. Returns the final cart.
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {'error': 'Expected a list of operations'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > self.max_operations:
+            return Response(
+                {'error': f'At most {self.max_operations} operations per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = CartBatchOperationSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        operations = serializer.validated_data
+        product_ids = {operation['product_id'] for operation in operations}
+
+        # Batches work on the database rows, so write back any cached changes first
+        store = get_cart_store()
+        store.flush(request.user)
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        with transaction.atomic():
+            stock = reservations.lock_stock(product_ids)
+            items = {
+                item.product_id: item
+                for item in CartItem.objects.select_for_update().filter(cart=cart, product_id__in=product_ids)
+            }
+
+            # Later operations for the same product build on earlier ones
+            quantities = {product_id: item.quantity for product_id, item in items.items()}
+            last_operation = {}
+            for index, operation in enumerate(operations):
+                product_id = operation['product_id']
+                if 'quantity' in operation:
+                    quantities[product_id] = operation['quantity']
+                else:
+                    quantities[product_id] = max(quantities.get(product_id, 0) + operation['delta'], 0)
+                last_operation[product_id] = index
+
+            # Stock held by other carts is not available
+            available = reservations.available_for(request.user, stock)
+            errors = [{} for _ in operations]
+            for product_id, quantity in quantities.items():
+                if product_id not in stock:
+                    errors[last_operation[product_id]] = {'product_id': ['Product not found']}
+                elif quantity > available[product_id]:
+                    errors[last_operation[product_id]] = {'quantity': ['Insufficient stock available']}
+            if any(errors):
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            now = timezone.now()
+            created, changed, removed = [], [], []
+            for product_id, quantity in quantities.items():
+                item = items.get(product_id)
+                if item is None:
+                    if quantity:
+                        created.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+                elif not quantity:
+                    removed.append(item.pk)
+                elif quantity != item.quantity:
+                    item.quantity = quantity
+                    item.updated_at = now
+                    changed.append(item)
+
+            reservations.reserve(request.user, quantities)
+            if changed:
+                CartItem.objects.bulk_update(changed, ['quantity', 'updated_at'])
+            if removed:
+                CartItem.objects.filter(pk__in=removed).delete()
+            if created:
+                try:
+                    with transaction.atomic():
+                        CartItem.objects.bulk_create(created)
+                except IntegrityError:
+                    # Another request added one of these products meanwhile
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'error': 'Cart was modified concurrently, please retry'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+        store.invalidate(request.user)
+        cart_serializer = CartSerializer(cart, context={'request': request})
         return Response(cart_serializer.data, status=status.HTTP_200_OK)
 
 
@@ -108,8 +174,8 @@ class GetCartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart)
+        cart = get_cart_store().get_cart(request.user)
+        serializer = CartSerializer(cart, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -118,6 +184,8 @@ class ClearCartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request):
+        get_cart_store().invalidate(request.user)
+        reservations.release(request.user)
         try:
             cart = Cart.objects.get(user=request.user)
             cart.items.all().delete()
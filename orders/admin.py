@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem, OrderStatusHistory
+from .models import IdempotencyKey, Order, OrderItem, OrderStatusHistory
 
 
 class OrderItemInline(admin.TabularInline):
@@ -60,3 +60,11 @@ class OrderStatusHistoryAdmin(admin.ModelAdmin):
     
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['user', 'key', 'response_status', 'expires_at', 'created_at']
+    list_filter = ['response_status', 'expires_at']
+    search_fields = ['user__username', 'key']
+    readonly_fields = ['fingerprint', 'response_status', 'response_body', 'lease_expires_at', 'created_at']
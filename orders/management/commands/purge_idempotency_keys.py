@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from orders.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired order Idempotency-Key records in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # Served by the expires_at index; short deletes keep lock times low
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
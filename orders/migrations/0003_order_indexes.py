@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_orderstatushistory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at', '-id'], name='orders_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatushistory',
+            index=models.Index(fields=['order', 'changed_at'], name='order_history_order_idx'),
+        ),
+    ]
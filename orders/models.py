@@ -1,8 +1,15 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from products.models import Product
 
 
+class StatusConflict(Exception):
+    """The order's status changed since it was read"""
+
+
 class Order(models.Model):
     """Order model"""
     
@@ -15,6 +22,17 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+
+    # Statuses each status may move to; delivered and cancelled are final
+    STATUS_TRANSITIONS = {
+        'pending': {'confirmed', 'cancelled'},
+        'confirmed': {'packed', 'cancelled'},
+        'packed': {'shipped', 'cancelled'},
+        'shipped': {'out_for_delivery'},
+        'out_for_delivery': {'delivered'},
+        'delivered': set(),
+        'cancelled': set(),
+    }
     
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -35,11 +53,82 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so a change can be detected without a query
+        if 'order_status' in instance.__dict__:
+            instance._loaded_status = instance.order_status
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if 'order_status' in self.__dict__ and (fields is None or 'order_status' in fields):
+            self._loaded_status = self.order_status
+
+    @classmethod
+    def can_transition(cls, old_status, new_status):
+        return new_status in cls.STATUS_TRANSITIONS.get(old_status, ())
+
+    @classmethod
+    def statuses_moving_to(cls, new_status):
+        """Statuses from which `new_status` can be reached in one step"""
+        return [status for status, targets in cls.STATUS_TRANSITIONS.items() if new_status in targets]
+
+    def clean(self):
+        super().clean()
+        old_status = getattr(self, '_loaded_status', None)
+        if old_status and old_status != self.order_status and not self.can_transition(old_status, self.order_status):
+            raise ValidationError({
+                'order_status': f'Cannot change status from {old_status} to {self.order_status}'
+            })
+
+    def transition_status(self, new_status, expected_status=None, changed_by=None, notes=''):
+        """
+        Move the order to `new_status` with a compare-and-swap UPDATE that
+        only matches while the stored status is still `expected_status`
+        (by default the status it was loaded with), and record the history
+        row in the same transaction. Raises ValidationError for a move the
+        transition graph does not allow and StatusConflict when the stored
+        status no longer matches.
+        """
+        expected_status = expected_status or getattr(self, '_loaded_status', self.order_status)
+        if new_status == expected_status:
+            return
+        if not self.can_transition(expected_status, new_status):
+            raise ValidationError({
+                'order_status': f'Cannot change status from {expected_status} to {new_status}'
+            })
+
+        now = timezone.now()
+        with transaction.atomic():
+            updated = Order.objects.filter(pk=self.pk, order_status=expected_status).update(
+                order_status=new_status,
+                updated_at=now,
+            )
+            if not updated:
+                raise StatusConflict
+            # The UPDATE bypasses the Order signals, so write the history here
+            OrderStatusHistory.objects.create(
+                order=self,
+                old_status=expected_status,
+                new_status=new_status,
+                changed_by=changed_by,
+                notes=notes,
+            )
+
+        self.order_status = self._loaded_status = new_status
+        self.updated_at = now
+
     class Meta:
         db_table = 'orders'
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='orders_created_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -102,3 +191,41 @@ class OrderStatusHistory(models.Model):
         verbose_name = 'Order Status History'
         verbose_name_plural = 'Order Status Histories'
         ordering = ['changed_at']
+        indexes = [
+            models.Index(fields=['order', 'changed_at'], name='order_history_order_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of an order request sent with an Idempotency-Key header, replayed
+    for retries of the same request until `expires_at`
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    # SHA-256 of the request body, so a reused key with another body is refused
+    fingerprint = models.CharField(max_length=64)
+    # Both null while the first request is still running
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    # While in progress, a retry may take over the key after this time; it also
+    # identifies the current holder, so a request that lost it cannot finish
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+
+    class Meta:
+        db_table = 'order_idempotency_keys'
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        unique_together = ['user', 'key']
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Order, OrderItem, OrderStatusHistory
 from products.models import Product
+from products.serializers import SparseFieldsetMixin
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -54,7 +55,7 @@ class OrderStatusHistorySerializer(serializers.ModelSerializer):
             return f"Order status changed to {obj.get_new_status_display().lower()} on {date_str}"
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Order model"""
     items = OrderItemSerializer(many=True, read_only=True)
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -70,6 +71,19 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'total_amount', 'created_at', 'updated_at']
 
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Order header fields with an item count, for order listings"""
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'user', 'order_status', 'total_amount', 'item_count',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
 class CreateOrderSerializer(serializers.Serializer):
     """Serializer for creating an order"""
     shipping_address = serializers.CharField()
@@ -89,3 +103,15 @@ class CreateOrderSerializer(serializers.Serializer):
 class UpdateOrderStatusSerializer(serializers.Serializer):
     """Serializer for updating order status (admin only)"""
     order_status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    # Only apply the change if the order is still in this status
+    expected_status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class BulkUpdateOrderStatusSerializer(serializers.Serializer):
+    """Serializer for moving many orders to one status (admin only)"""
+    order_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    order_status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    # Only move orders currently in this status, e.g. packed -> shipped
+    from_status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
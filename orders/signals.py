@@ -6,20 +6,25 @@ from .models import Order, OrderStatusHistory
 @receiver(pre_save, sender=Order)
 def capture_previous_status(sender, instance, **kwargs):
     """Capture the previous status before saving"""
-    if instance.pk:
-        try:
-            previous = Order.objects.get(pk=instance.pk)
-            instance._previous_status = previous.order_status
-        except Order.DoesNotExist:
-            instance._previous_status = None
-    else:
+    if not instance.pk:
         instance._previous_status = None
+    elif hasattr(instance, '_loaded_status'):
+        # Loaded from the database (see Order.from_db), no query needed
+        instance._previous_status = instance._loaded_status
+    else:
+        # Built by hand with a pk, so the stored status is unknown
+        instance._previous_status = (
+            Order.objects.filter(pk=instance.pk).values_list('order_status', flat=True).first()
+        )
 
 
 @receiver(post_save, sender=Order)
-def track_order_status_change(sender, instance, created, **kwargs):
+def track_order_status_change(sender, instance, created, update_fields=None, **kwargs):
     """Automatically create history entry when order is created or status changes"""
-    
+    if update_fields is not None and 'order_status' not in update_fields:
+        # The stored status was not written
+        return
+
     if created:
         # Order creation - record initial "pending" status
         OrderStatusHistory.objects.create(
@@ -39,3 +44,6 @@ def track_order_status_change(sender, instance, created, **kwargs):
             changed_by=changed_by,
             notes=getattr(instance, '_change_notes', '')
         )
+
+    # The saved status is now the stored one, for the next save of this instance
+    instance._loaded_status = instance.order_status
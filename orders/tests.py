@@ -0,0 +1,300 @@
+import hashlib
+import json
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from cart import reservations
+from cart.models import Cart, CartItem
+from products.models import Product
+from .models import IdempotencyKey, Order, OrderStatusHistory, StatusConflict
+from .views import CreateOrderView
+
+ORDER = {'shipping_address': '221B Baker Street, London', 'phone_number': '9876543210'}
+
+
+def place_order(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client.post(reverse('orders:create'), ORDER, format='json')
+
+
+class CheckoutQueryTests(TestCase):
+    def checkout(self, size):
+        user = User.objects.create_user(f'shopper{size}', f'shopper{size}@example.com', 'password')
+        cart = Cart.objects.create(user=user)
+        for i in range(size):
+            product = Product.objects.create(name=f'Item {i}', description='Item', price=10, stock=5)
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+        # The same statements whatever the cart size (see CreateOrderView.place_order)
+        with self.assertNumQueries(14):
+            response = place_order(user)
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        small = self.checkout(1)
+        large = self.checkout(30)
+
+        self.assertEqual(len(small['items']), 1)
+        self.assertEqual(len(large['items']), 30)
+        self.assertEqual(large['total_amount'], '600.00')
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {3})
+        self.assertFalse(CartItem.objects.exists())
+
+
+class CheckoutCartChangeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.cart = Cart.objects.create(user=cls.user)
+        cls.milk = Product.objects.create(name='Milk', description='Item', price=10, stock=10)
+        cls.bread = Product.objects.create(name='Bread', description='Item', price=5, stock=10)
+        cls.item = CartItem.objects.create(cart=cls.cart, product=cls.milk, quantity=2)
+
+    def checkout_while(self, change_cart):
+        """Place an order, changing the cart after it was read but before it is cleared"""
+        held_by = reservations.held_by
+
+        def change_then_read(*args, **kwargs):
+            change_cart()
+            return held_by(*args, **kwargs)
+
+        with mock.patch('orders.views.reservations.held_by', side_effect=change_then_read):
+            return place_order(self.user)
+
+    def test_quantity_changed_during_checkout_fails_without_losing_it(self):
+        response = self.checkout_while(lambda: CartItem.objects.filter(pk=self.item.pk).update(quantity=5))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+        # The change ran inside the rolled back checkout here; a concurrent one
+        # would have committed, either way the item was not cleared
+        self.assertTrue(CartItem.objects.filter(pk=self.item.pk).exists())
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.stock, 10)
+
+    def test_item_added_during_checkout_stays_in_the_cart(self):
+        response = self.checkout_while(
+            lambda: CartItem.objects.create(cart=self.cart, product=self.bread, quantity=1)
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['product'] for item in response.json()['items']], [self.milk.pk])
+        self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')), [(self.bread.pk, 1)])
+
+
+class IdempotencyKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.product = Product.objects.create(name='Milk', description='Item', price=10, stock=10)
+        CartItem.objects.create(cart=Cart.objects.create(user=cls.user), product=cls.product, quantity=2)
+
+    def post(self, key, body=ORDER):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.post(reverse('orders:create'), body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def claim(self, key, lease_expires_at):
+        fingerprint = hashlib.sha256(json.dumps(ORDER, sort_keys=True).encode('utf-8')).hexdigest()
+        return IdempotencyKey.objects.create(
+            user=self.user,
+            key=key,
+            fingerprint=fingerprint,
+            lease_expires_at=lease_expires_at,
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+
+    def test_retry_replays_the_order(self):
+        first = self.post('k1')
+        retry = self.post('k1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reuse_with_a_different_body_is_refused(self):
+        self.post('k1')
+        response = self.post('k1', {**ORDER, 'phone_number': '9999999999'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_in_progress_conflicts(self):
+        self.claim('k1', timezone.now() + timedelta(seconds=30))
+        response = self.post('k1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_expired_lease_is_taken_over(self):
+        self.claim('k1', timezone.now() - timedelta(seconds=1))
+        response = self.post('k1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get(key='k1').response_status, 201)
+        self.assertEqual(self.post('k1').json()['id'], response.json()['id'])
+
+    def test_request_that_places_no_order_releases_the_key(self):
+        invalid = self.post('k1', {**ORDER, 'shipping_address': 'short'})
+        corrected = self.post('k1')
+
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(corrected.status_code, 201)
+
+    def test_stock_failure_releases_the_key(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+        self.assertEqual(self.post('k1').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        Product.objects.filter(pk=self.product.pk).update(stock=10)
+        self.assertEqual(self.post('k1').status_code, 201)
+
+
+class OrderStatusHistoryQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.order = Order.objects.create(user=user, total_amount=20, **ORDER)
+
+    def test_status_change_on_loaded_order(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.order_status = 'confirmed'
+        # The previous status comes from the loaded row: update, history insert
+        with self.assertNumQueries(2):
+            order.save()
+        self.assertEqual(
+            list(OrderStatusHistory.objects.filter(order=order).values_list('old_status', 'new_status')),
+            [(None, 'pending'), ('pending', 'confirmed')],
+        )
+
+    def test_save_without_status_change(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.shipping_address = '10 Downing Street, London'
+        with self.assertNumQueries(1):
+            order.save()
+        self.assertEqual(OrderStatusHistory.objects.filter(order=order).count(), 1)
+
+    def test_status_change_on_hand_built_order(self):
+        order = Order(
+            pk=self.order.pk,
+            user_id=self.order.user_id,
+            order_status='confirmed',
+            total_amount=20,
+            created_at=self.order.created_at,
+            **ORDER,
+        )
+        # Nothing was loaded, so the stored status is read first
+        with self.assertNumQueries(3):
+            order.save()
+        self.assertTrue(
+            OrderStatusHistory.objects.filter(order=order, old_status='pending', new_status='confirmed').exists()
+        )
+
+
+class OrderStatusTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.order = Order.objects.create(user=user, total_amount=20, **ORDER)
+
+    def put_status(self, body):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        return client.put(reverse('orders:update_status', args=[self.order.pk]), body, format='json')
+
+    def assertStoredStatus(self, order_status, history_rows):
+        self.assertEqual(Order.objects.get(pk=self.order.pk).order_status, order_status)
+        self.assertEqual(OrderStatusHistory.objects.filter(order=self.order).count(), history_rows)
+
+    def test_allowed_transition(self):
+        response = self.put_status({'order_status': 'confirmed', 'expected_status': 'pending'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertStoredStatus('confirmed', 2)
+        history = OrderStatusHistory.objects.filter(order=self.order).latest('changed_at')
+        self.assertEqual(
+            (history.old_status, history.new_status, history.changed_by),
+            ('pending', 'confirmed', self.admin),
+        )
+
+    def test_illegal_jump_is_refused(self):
+        response = self.put_status({'order_status': 'delivered'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('order_status', response.json())
+        self.assertStoredStatus('pending', 1)
+
+    def test_stale_expected_status_conflicts_without_history(self):
+        response = self.put_status({'order_status': 'packed', 'expected_status': 'confirmed'})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertStoredStatus('pending', 1)
+
+    def test_two_stale_instances_make_one_transition(self):
+        first = Order.objects.get(pk=self.order.pk)
+        second = Order.objects.get(pk=self.order.pk)
+
+        first.transition_status('confirmed')
+        with self.assertRaises(StatusConflict):
+            second.transition_status('cancelled')
+        self.assertStoredStatus('confirmed', 2)
+
+    def test_history_is_written_in_the_same_transaction(self):
+        order = Order.objects.get(pk=self.order.pk)
+        with mock.patch.object(OrderStatusHistory.objects, 'create', side_effect=DatabaseError('history failed')):
+            with self.assertRaises(DatabaseError):
+                order.transition_status('confirmed')
+        # The status update was rolled back together with the history insert
+        self.assertStoredStatus('pending', 1)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_parallel_checkouts_do_not_oversell(self):
+        product = Product.objects.create(name='Last units', description='Item', price=10, stock=5)
+        users = []
+        for i in range(8):
+            user = User.objects.create_user(f'shopper{i}', f'shopper{i}@example.com', 'password')
+            CartItem.objects.create(cart=Cart.objects.create(user=user), product=product, quantity=1)
+            users.append(user)
+
+        statuses = []
+        start = threading.Barrier(len(users))
+
+        def checkout(user):
+            start.wait()
+            try:
+                while True:
+                    # Call the view directly: the test client's exception hook is
+                    # process-wide and would re-raise other threads' errors
+                    request = APIRequestFactory().post(reverse('orders:create'), ORDER, format='json')
+                    force_authenticate(request, user)
+                    try:
+                        statuses.append(CreateOrderView.as_view()(request).status_code)
+                        return
+                    except OperationalError:
+                        # SQLite has no row locks and rejects concurrent writers
+                        continue
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201] * 5 + [400] * 3)
+        self.assertEqual(Order.objects.count(), 5)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
@@ -4,6 +4,7 @@ from .views import (
     OrderDetailView,
     UserOrdersView,
     UpdateOrderStatusView,
+    BulkUpdateOrderStatusView,
     TimelineView
 )
 
@@ -14,5 +15,6 @@ urlpatterns = [
     path('<int:order_id>', OrderDetailView.as_view(), name='detail'),
     path('user/<int:user_id>', UserOrdersView.as_view(), name='user_orders'),
     path('<int:order_id>/status', UpdateOrderStatusView.as_view(), name='update_status'),
+    path('status/bulk', BulkUpdateOrderStatusView.as_view(), name='bulk_update_status'),
     path('<int:order_id>/timeline', TimelineView.as_view(), name='timeline'),
 ]
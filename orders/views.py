@@ -1,15 +1,34 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.shortcuts import get_object_or_404
-from django.db import transaction
-from .models import Order, OrderItem, OrderStatusHistory
-from cart.models import Cart
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Prefetch, Q, Subquery, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import IdempotencyKey, Order, OrderItem, OrderStatusHistory, StatusConflict
+from cart.models import CartItem
+from cart import reservations
+from cart.store import get_cart_store
+from products.cache import bump_catalog_version
+from products.models import Product
+from products.pagination import KeysetPagination
 from .serializers import (
     OrderSerializer,
+    OrderSummarySerializer,
     CreateOrderSerializer,
     UpdateOrderStatusSerializer,
+    BulkUpdateOrderStatusSerializer,
     OrderStatusHistorySerializer
 )
 
@@ -17,67 +36,234 @@ from .serializers import (
 class CreateOrderView(APIView):
     """Create a new order from cart items"""
     permission_classes = [IsAuthenticated]
+    idempotency_header = 'Idempotency-Key'
 
     def post(self, request):
+        key = request.headers.get(self.idempotency_header)
+        if key is None:
+            return self.place_order(request)
+        if not key or len(key) > 255:
+            return Response(
+                {'error': f'{self.idempotency_header} must be 1 to 255 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Claim the key before checkout so a concurrent retry cannot run it twice
+        fingerprint = hashlib.sha256(
+            json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder).encode('utf-8')
+        ).hexdigest()
+        record, created = self.claim_key(request.user, key, fingerprint)
+        if not created:
+            if record is not None and record.fingerprint != fingerprint:
+                return Response(
+                    {'error': f'{self.idempotency_header} was already used with a different request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record is None or record.response_status is None:
+                return Response(
+                    {'error': f'A request with this {self.idempotency_header} is still in progress'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            # Replay the original outcome without running checkout again
+            return Response(record.response_body, status=record.response_status)
+
+        try:
+            response = self.place_order(request, record)
+        except Exception:
+            # A placed order stores its response in the checkout transaction, so
+            # a key still in progress means nothing was committed: release it
+            # for a retry, unless another request has taken it over meanwhile.
+            self.held_key(record).delete()
+            raise
+        if record.response_status is None:
+            # No order was placed (invalid body, empty cart, missing stock), so
+            # release the key: a corrected or later retry must run checkout again
+            self.held_key(record).delete()
+        return response
+
+    @staticmethod
+    def claim_key(user, key, fingerprint):
+        """
+        Return `(record, created)`. An expired record is replaced, and one whose
+        request never finished is taken over once its lease has run out.
+        """
+        now = timezone.now()
+        lease_expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(
+                        user=user,
+                        key=key,
+                        fingerprint=fingerprint,
+                        lease_expires_at=lease_expires_at,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    ), True
+            except IntegrityError:
+                record = IdempotencyKey.objects.filter(user=user, key=key).first()
+                if record is None:
+                    continue
+                if record.expires_at <= now:
+                    record.delete()
+                    continue
+                if (
+                    record.response_status is None
+                    and record.fingerprint == fingerprint
+                    and record.lease_expires_at is not None
+                    and record.lease_expires_at <= now
+                    and CreateOrderView.held_key(record).update(lease_expires_at=lease_expires_at)
+                ):
+                    record.lease_expires_at = lease_expires_at
+                    return record, True
+                return record, False
+        return None, False
+
+    @staticmethod
+    def held_key(record):
+        """The record as a queryset, matching only while this request holds its lease"""
+        return IdempotencyKey.objects.filter(
+            pk=record.pk,
+            response_status__isnull=True,
+            lease_expires_at=record.lease_expires_at,
+        )
+
+    def store_response(self, record, response_status, response_body):
+        """Save the outcome for replay; False if the key was taken over meanwhile"""
+        if not self.held_key(record).update(
+            response_status=response_status,
+            response_body=response_body,
+            lease_expires_at=None,
+        ):
+            return False
+        record.response_status = response_status
+        record.response_body = response_body
+        record.lease_expires_at = None
+        return True
+
+    def place_order(self, request, idempotency_key=None):
         serializer = CreateOrderSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            cart = Cart.objects.get(user=request.user)
-        except Cart.DoesNotExist:
-            return Response(
-                {'error': 'Cart is empty'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Checkout reads Cart/CartItem, so write back any cached cart changes
+        cart_store = get_cart_store()
+        cart_store.flush(request.user)
 
-        if cart.items.count() == 0:
+        # One query for the whole cart; the products are read under lock below
+        cart_items = list(
+            CartItem.objects.filter(cart__user=request.user)
+            .order_by('created_at', 'id')
+            .values_list('id', 'product_id', 'quantity')
+        )
+        quantities = {product_id: quantity for _, product_id, quantity in cart_items}
+        if not quantities:
             return Response(
                 {'error': 'Cart is empty'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        product_ids = list(quantities)
 
         # Create order within a transaction
         with transaction.atomic():
-            # Calculate total amount
-            total_amount = cart.total_price
+            products = {
+                product['id']: product
+                for product in Product.objects.select_for_update()
+                .filter(id__in=product_ids)
+                .order_by('id')
+                .values('id', 'name', 'stock', 'discounted_price')
+            }
 
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                total_amount=total_amount,
-                shipping_address=serializer.validated_data['shipping_address'],
-                phone_number=serializer.validated_data['phone_number']
-            )
+            # Items covered by the user's active holds are guaranteed; only the
+            # rest are checked against stock not held by other carts
+            held = reservations.held_by(request.user, product_ids)
+            unheld = {
+                product_id: product['stock'] for product_id, product in products.items()
+                if held.get(product_id, 0) < quantities[product_id]
+            }
+            available = reservations.available_for(request.user, unheld) if unheld else {}
 
-            # Create order items from cart items
-            for cart_item in cart.items.all():
-                # Check stock availability
-                if cart_item.product.stock < cart_item.quantity:
+            for product_id, quantity in quantities.items():
+                product = products.get(product_id)
+                if product is None or min(product['stock'], available.get(product_id, quantity)) < quantity:
                     transaction.set_rollback(True)
                     return Response(
-                        {'error': f'Insufficient stock for {cart_item.product.name}'},
+                        {'error': f'Insufficient stock for {product["name"] if product else "a removed product"}'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
 
-                # Create order item
-                OrderItem.objects.create(
+            order = Order.objects.create(
+                user=request.user,
+                total_amount=sum(
+                    products[product_id]['discounted_price'] * quantity
+                    for product_id, quantity in quantities.items()
+                ),
+                shipping_address=serializer.validated_data['shipping_address'],
+                phone_number=serializer.validated_data['phone_number']
+            )
+
+            # bulk_create skips OrderItem.save(), so set the subtotal here
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
-                    product=cart_item.product,
-                    product_name=cart_item.product.name,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.discounted_price
+                    product_id=product_id,
+                    product_name=products[product_id]['name'],
+                    quantity=quantity,
+                    price=products[product_id]['discounted_price'],
+                    subtotal=products[product_id]['discounted_price'] * quantity,
                 )
+                for product_id, quantity in quantities.items()
+            ])
 
-                # Update product stock
-                cart_item.product.stock -= cart_item.quantity
-                cart_item.product.save()
+            # Decrement all stock in one guarded UPDATE: a row only changes if
+            # it still has enough, so even without row locks (SQLite) a
+            # concurrent checkout cannot oversell.
+            decremented = Product.objects.filter(
+                reduce(or_, (Q(id=product_id, stock__gte=quantity) for product_id, quantity in quantities.items()))
+            ).update(
+                stock=Case(
+                    *[When(id=product_id, then=F('stock') - quantity) for product_id, quantity in quantities.items()],
+                    output_field=IntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+            if decremented != len(quantities):
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': 'Insufficient stock for one or more items'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # The UPDATE bypasses the Product signals
+            bump_catalog_version()
 
-            # Clear cart after successful order
-            cart.items.all().delete()
+            # Clear exactly the items ordered. The cart was read without a lock,
+            # so if an item changed or was removed meanwhile, fail instead of
+            # dropping a change that was never ordered; later additions stay.
+            cleared, _ = CartItem.objects.filter(
+                reduce(or_, (Q(id=item_id, quantity=quantity) for item_id, _, quantity in cart_items))
+            ).delete()
+            if cleared != len(cart_items):
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': 'Cart was modified during checkout, please retry'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            # The holds became stock decrements
+            reservations.release(request.user, product_ids)
+            transaction.on_commit(lambda: cart_store.invalidate(request.user))
 
-        order_serializer = OrderSerializer(order)
-        return Response(order_serializer.data, status=status.HTTP_201_CREATED)
+            data = OrderSerializer(order, context={'request': request}).data
+            # Stored in the same transaction, so the key cannot be released (or
+            # taken over) once the order exists
+            if idempotency_key is not None and not self.store_response(
+                idempotency_key, status.HTTP_201_CREATED, data
+            ):
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': f'A request with this {self.idempotency_header} is still in progress'},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        return Response(data, status=status.HTTP_201_CREATED)
 
 
 class OrderDetailView(APIView):
@@ -94,13 +280,14 @@ class OrderDetailView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        serializer = OrderSerializer(order)
+        serializer = OrderSerializer(order, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class UserOrdersView(APIView):
-    """Get all orders for a specific user"""
+    """Get all orders for a specific user, newest first"""
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get(self, request, user_id):
         # Users can only view their own orders, admins can view all
@@ -110,9 +297,42 @@ class UserOrdersView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        orders = Order.objects.filter(user_id=user_id).prefetch_related('items')
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        orders = Order.objects.filter(user_id=user_id).order_by('-created_at', '-pk')
+        if request.query_params.get('view') == 'summary':
+            # Header fields only; the item count is computed for the page rows
+            orders = orders.only('id', 'user', 'order_status', 'total_amount', 'created_at', 'updated_at').annotate(
+                item_count=Coalesce(
+                    Subquery(
+                        OrderItem.objects.filter(order=OuterRef('pk'))
+                        .order_by()
+                        .values('order')
+                        .annotate(count=Count('id'))
+                        .values('count')
+                    ),
+                    0,
+                )
+            )
+            serializer_class = OrderSummarySerializer
+        else:
+            fields, omit = OrderSerializer.get_requested_fields(request.query_params)
+
+            def requested(name):
+                return (fields is None or name in fields) and name not in (omit or ())
+
+            if requested('user_name'):
+                orders = orders.select_related('user')
+            if requested('items'):
+                orders = orders.prefetch_related('items')
+            if requested('history'):
+                orders = orders.prefetch_related(
+                    Prefetch('history', queryset=OrderStatusHistory.objects.select_related('changed_by'))
+                )
+            serializer_class = OrderSerializer
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = serializer_class(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
 
 class UpdateOrderStatusView(APIView):
@@ -126,15 +346,100 @@ class UpdateOrderStatusView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Set changed_by to track who made the change in history
-        order._changed_by = request.user
-        order.order_status = serializer.validated_data['order_status']
-        order.save()
+        try:
+            order.transition_status(
+                serializer.validated_data['order_status'],
+                expected_status=serializer.validated_data.get('expected_status'),
+                changed_by=request.user,
+                notes=serializer.validated_data['notes'],
+            )
+        except ValidationError as exc:
+            return Response(exc.message_dict, status=status.HTTP_400_BAD_REQUEST)
+        except StatusConflict:
+            return Response(
+                {'error': 'Order status has changed, reload the order and retry'},
+                status=status.HTTP_409_CONFLICT
+            )
 
-        order_serializer = OrderSerializer(order)
+        order_serializer = OrderSerializer(order, context={'request': request})
         return Response(order_serializer.data, status=status.HTTP_200_OK)
 
 
+class BulkUpdateOrderStatusView(APIView):
+    """Move many orders to one status (admin only)"""
+    permission_classes = [IsAdminUser]
+    max_orders = 1000
+
+    def post(self, request):
+        """
+        Body is {order_ids, order_status, from_status?, notes?}. All orders
+        move in one UPDATE and their history rows in one INSERT; the
+        response has one compact result per order, in request order.
+        """
+        serializer = BulkUpdateOrderStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        order_ids = list(dict.fromkeys(data['order_ids']))
+        if len(order_ids) > self.max_orders:
+            return Response(
+                {'error': f'At most {self.max_orders} orders per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        new_status = data['order_status']
+        from_status = data.get('from_status')
+
+        with transaction.atomic():
+            current = dict(
+                Order.objects.select_for_update()
+                .filter(id__in=order_ids)
+                .order_by('id')
+                .values_list('id', 'order_status')
+            )
+
+            results = []
+            moved = []
+            for order_id in order_ids:
+                old_status = current.get(order_id)
+                if old_status is None:
+                    results.append({'id': order_id, 'status': 'not_found'})
+                    continue
+                result = {'id': order_id, 'old_status': old_status, 'order_status': old_status}
+                if from_status is not None and old_status != from_status:
+                    result['status'] = 'status_mismatch'
+                elif old_status == new_status:
+                    result['status'] = 'unchanged'
+                elif not Order.can_transition(old_status, new_status):
+                    result['status'] = 'invalid_transition'
+                else:
+                    result.update(status='updated', order_status=new_status)
+                    moved.append(order_id)
+                results.append(result)
+
+            if moved:
+                Order.objects.filter(id__in=moved, order_status__in=Order.statuses_moving_to(new_status)).update(
+                    order_status=new_status,
+                    updated_at=timezone.now(),
+                )
+                # The UPDATE bypasses the Order signals, so write the history here
+                OrderStatusHistory.objects.bulk_create([
+                    OrderStatusHistory(
+                        order_id=order_id,
+                        old_status=current[order_id],
+                        new_status=new_status,
+                        changed_by=request.user,
+                        notes=data['notes'],
+                    )
+                    for order_id in moved
+                ])
+
+        return Response({
+            'updated': len(moved),
+            'failed': len(results) - len(moved),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
 class TimelineView(APIView):
     """Get order status history timeline"""
     permission_classes = [IsAuthenticated]
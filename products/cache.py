@@ -0,0 +1,134 @@
+"""
+Versioned response cache for the public catalog.
+
+Every Product/Category write bumps a catalog version counter. Cached list and
+detail responses remember the version they were rendered at, so a bump makes
+them stale without having to find and delete individual keys.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a version lost to eviction never repeats
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate all cached catalog responses once the current transaction commits"""
+    transaction.on_commit(_bump_catalog_version)
+
+
+def _bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag.strip('"') in [tag.strip('"') for tag in etags]
+
+
+class CatalogCacheMixin:
+    """
+    Serve anonymous JSON list/retrieve requests from the catalog cache.
+
+    Entries carry a strong ETag over the rendered body, and conditional GETs
+    get a 304. When the version changes only one request per URL re-renders
+    (guarded by a cache lock); concurrent requests keep getting the previous
+    body until the new one is stored.
+    """
+    catalog_cache_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def is_catalog_cacheable(self, request):
+        return (
+            self.action in self.catalog_cache_actions
+            and request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and getattr(request.accepted_renderer, 'format', None) == 'json'
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_catalog_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key = 'catalog:response:' + hashlib.sha256(
+            request.build_absolute_uri().encode('utf-8')
+        ).hexdigest()
+        version = get_catalog_version()
+        entry = cache.get(key)
+
+        if entry is None or entry['version'] != version:
+            lock_key = f'{key}:lock:{version}'
+            if cache.add(lock_key, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT):
+                try:
+                    response = handler(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    entry = self.build_cache_entry(response, version)
+                    cache.set(key, entry, timeout=settings.CATALOG_CACHE_TIMEOUT)
+                finally:
+                    cache.delete(lock_key)
+            elif entry is None:
+                entry = self.wait_for_cache_entry(key, version)
+                if entry is None:
+                    return handler(request, *args, **kwargs)
+
+        if etag_matches(request, entry['etag']):
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    def build_cache_entry(self, response, version):
+        renderer = self.request.accepted_renderer
+        content = renderer.render(
+            response.data,
+            self.request.accepted_media_type,
+            self.get_renderer_context(),
+        )
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        return {
+            'version': version,
+            'content': content,
+            'content_type': content_type,
+            'etag': quote_etag(hashlib.sha256(content).hexdigest()[:32]),
+        }
+
+    def wait_for_cache_entry(self, key, version):
+        """Poll briefly for another worker to fill the entry instead of piling on"""
+        deadline = time.monotonic() + settings.CATALOG_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None and entry['version'] == version:
+                return entry
+        return None
@@ -0,0 +1,88 @@
+"""
+Streaming catalog export.
+
+Products are read with `values().iterator(chunk_size=...)` (a server-side
+cursor on PostgreSQL) and encoded row by row through ProductRowSerializer, so
+memory use stays flat however large the catalog is. Used by the
+`/products/export/` endpoint and the `export_catalog` management command.
+"""
+import csv
+import zlib
+
+from rest_framework.utils.encoders import JSONEncoder
+from .serializers import ProductRowSerializer
+
+EXPORT_FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+DEFAULT_CHUNK_SIZE = 2000
+# Encoded output is handed out in blocks of roughly this many bytes
+BLOCK_SIZE = 64 * 1024
+
+
+class _LineBuffer:
+    """File-like object for csv.writer that hands back each written line"""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, fields=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield ProductSerializer-shaped dicts for `queryset` in primary key order"""
+    row_serializer = ProductRowSerializer(fields)
+    convert = row_serializer.to_representation
+    rows = queryset.order_by('pk').values(*row_serializer.columns)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield convert(row)
+
+
+def iter_jsonl(queryset, fields=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for item in iter_rows(queryset, fields, chunk_size):
+        yield encoder.encode(item) + '\n'
+
+
+def iter_csv(queryset, fields=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    fields = list(fields if fields is not None else ProductRowSerializer().fields)
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(fields)
+    for item in iter_rows(queryset, fields, chunk_size):
+        # category_name is absent for uncategorised products
+        yield writer.writerow(['' if item.get(name) is None else item[name] for name in fields])
+
+
+def export_catalog(queryset, fmt='jsonl', fields=None, chunk_size=DEFAULT_CHUNK_SIZE, compress=False):
+    """
+    Yield the encoded export of `queryset` as byte blocks, gzip-compressed
+    when `compress` is set.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format {fmt!r}')
+    lines = (iter_jsonl if fmt == 'jsonl' else iter_csv)(queryset, fields, chunk_size)
+    blocks = _iter_blocks(lines)
+    return _gzip_blocks(blocks) if compress else blocks
+
+
+def _iter_blocks(lines):
+    block = []
+    size = 0
+    for line in lines:
+        line = line.encode('utf-8')
+        block.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield b''.join(block)
+            block = []
+            size = 0
+    if block:
+        yield b''.join(block)
+
+
+def _gzip_blocks(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
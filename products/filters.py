@@ -0,0 +1,12 @@
+import django_filters
+from .models import Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    """Product filters; price bounds apply to the stored discounted price"""
+    min_price = django_filters.NumberFilter(field_name='discounted_price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='discounted_price', lookup_expr='lte')
+
+    class Meta:
+        model = Product
+        fields = ['category', 'category__name', 'min_price', 'max_price']
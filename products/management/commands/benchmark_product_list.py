@@ -0,0 +1,91 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from products.models import Category, Product, compute_discounted_price
+from products.serializers import ProductRowSerializer, ProductSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare ProductSerializer with the ProductRowSerializer fast path on a '
+        'page of products. All generated rows are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._populate(options['products'], options['seed'])
+                self._run(options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _populate(self, count, seed):
+        rng = random.Random(seed)
+        categories = [Category.objects.create(name=f'__benchmark_list_{i}__') for i in range(5)]
+        products = []
+        for i in range(count):
+            price, discount = rng.randint(100, 500000) / 100, rng.randint(0, 50)
+            products.append(Product(
+                name=f'Product {i}',
+                description='Benchmark product ' * 10,
+                category=rng.choice(categories + [None]),
+                price=price,
+                discount=discount,
+                discounted_price=compute_discounted_price(price, discount),
+                stock=rng.randint(0, 20),
+            ))
+        Product.objects.bulk_create(products, batch_size=1000)
+        self.ids = list(Product.objects.filter(name__startswith='Product ').values_list('id', flat=True))
+
+    def _run(self, repeat):
+        queryset = Product.objects.select_related('category').filter(id__in=self.ids)
+        renderer = JSONRenderer()
+        row_serializer = ProductRowSerializer()
+
+        instances = list(queryset.all())
+        rows = list(queryset.values(*row_serializer.columns))
+
+        expected = renderer.render(ProductSerializer(instances, many=True).data)
+        actual = renderer.render(row_serializer.serialize(rows))
+        if expected != actual:
+            raise CommandError('ProductRowSerializer output differs from ProductSerializer')
+
+        serializer_only = self._time(lambda: ProductSerializer(instances, many=True).data, repeat)
+        rows_only = self._time(lambda: row_serializer.serialize(rows), repeat)
+        # .all() clones the queryset so every run goes back to the database
+        serializer_total = self._time(lambda: ProductSerializer(list(queryset.all()), many=True).data, repeat)
+        rows_total = self._time(
+            lambda: row_serializer.serialize(list(queryset.values(*row_serializer.columns))), repeat
+        )
+
+        self.stdout.write(f'{len(instances)} products, identical output ({len(actual)} bytes)')
+        self.stdout.write(
+            f'serialize only : ProductSerializer {serializer_only:8.2f} ms | '
+            f'ProductRowSerializer {rows_only:8.2f} ms | x{serializer_only / rows_only:.1f}'
+        )
+        self.stdout.write(
+            f'query + serialize: ProductSerializer {serializer_total:8.2f} ms | '
+            f'ProductRowSerializer {rows_total:8.2f} ms | x{serializer_total / rows_total:.1f}'
+        )
+
+    def _time(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,100 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from products import search
+from products.models import Category, Product
+
+WORDS = [
+    'organic', 'fresh', 'milk', 'bread', 'butter', 'cheese', 'apple', 'banana',
+    'mango', 'juice', 'coffee', 'tea', 'green', 'black', 'rice', 'wheat', 'flour',
+    'sugar', 'salt', 'honey', 'chocolate', 'cookie', 'biscuit', 'chips', 'soap',
+    'shampoo', 'detergent', 'tissue', 'yogurt', 'paneer', 'almond', 'cashew',
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the full-text product search with the old icontains SearchFilter '
+        'on a synthetic catalog. All generated rows are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('terms', nargs='*', default=['milk', 'choc', 'green tea', 'organic honey', 'term4242'])
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Full-text search is only available on PostgreSQL and SQLite')
+
+        try:
+            with transaction.atomic():
+                self._populate(options['products'], options['seed'])
+                self._run(options['terms'], options['repeat'], options['page_size'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _populate(self, count, seed):
+        rng = random.Random(seed)
+        category = Category.objects.create(name='__benchmark_search__')
+        self.stdout.write(f'Generating {count} products...')
+        batch = []
+        for i in range(count):
+            batch.append(Product(
+                name=' '.join(rng.sample(WORDS, 3)).title(),
+                description=' '.join(
+                    [rng.choice(WORDS)] + [f'term{rng.randint(0, 50000)}' for _ in range(25)]
+                ),
+                category=category,
+                price=rng.randint(10, 5000),
+                stock=rng.randint(0, 100),
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        search.rebuild_index()
+
+    def _run(self, terms, repeat, page_size):
+        base = Product.objects.select_related('category')
+        # The API orders by relevance with the pk tie-break the paginator adds
+        ranked = search.rank_ordering()
+        ranked = [ranked, '-pk' if ranked.startswith('-') else 'pk']
+        self.stdout.write(f'{"":>18}  {"icontains, newest":>18} {"full-text, newest":>18} {"full-text, ranked":>18}')
+        for term in terms:
+            icontains = Q()
+            for word in term.split():
+                icontains &= Q(name__icontains=word) | Q(description__icontains=word)
+
+            old = self._time(
+                lambda: list(base.filter(icontains).order_by('-created_at', '-pk')[:page_size]), repeat
+            )
+            newest = self._time(
+                lambda: list(search.search(base, [term], rank=False).order_by('-created_at', '-pk')[:page_size]),
+                repeat,
+            )
+            relevance = self._time(
+                lambda: list(search.search(base, [term]).order_by(*ranked)[:page_size]), repeat
+            )
+            self.stdout.write(
+                f'{term!r:>18}: {old:15.2f} ms {newest:15.2f} ms {relevance:15.2f} ms'
+            )
+
+    def _time(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
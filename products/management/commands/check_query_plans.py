@@ -0,0 +1,96 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from cart.models import CartItem, StockReservation
+from orders.models import Order, OrderStatusHistory
+from products.models import Category, Product
+from products.pagination import KeysetPagination
+
+# Plan fragments that mean a full table scan or an in-memory sort
+PLAN_PROBLEMS = {
+    'sqlite': [
+        (re.compile(r'\bSCAN (?!.*\bUSING (?:COVERING )?INDEX\b)(?!.*\bUSING INTEGER PRIMARY KEY\b)\S+'), 'table scan'),
+        (re.compile(r'\bUSE TEMP B-TREE\b'), 'temporary sort'),
+    ],
+    'postgresql': [
+        (re.compile(r'\bSeq Scan on\b'), 'sequential scan'),
+        (re.compile(r'(?:^|->)\s*Sort\b', re.MULTILINE), 'sort'),
+    ],
+}
+
+
+def hot_queries():
+    """The listing queries behind the busiest endpoints, as the views build them"""
+    page = slice(0, KeysetPagination.page_size + 1)
+    now = timezone.now()
+    seek = KeysetPagination().seek_filter([('created_at', True), ('pk', True)], [now, 1])
+    return [
+        (
+            'GET /products/',
+            Product.objects.order_by('-created_at', '-pk')
+            .values('id', 'name', 'category__name', 'created_at')[page],
+        ),
+        (
+            'GET /products/?cursor=...',
+            Product.objects.filter(seek).order_by('-created_at', '-pk').values('id', 'created_at')[page],
+        ),
+        (
+            'GET /products/?category=<id>',
+            Product.objects.filter(category_id=1).order_by('-created_at', '-pk').values('id', 'created_at')[page],
+        ),
+        ('GET /categories/', Category.objects.order_by('name', 'pk')[page]),
+        ('GET /orders/user/<id>', Order.objects.filter(user_id=1).order_by('-created_at', '-pk')[page]),
+        ('Order admin list', Order.objects.order_by('-created_at', '-pk')[page]),
+        ('GET /orders/<id>/timeline', OrderStatusHistory.objects.filter(order_id=1).order_by('changed_at')),
+        ('GET /cart/', CartItem.objects.filter(cart_id=1)),
+        (
+            'Available stock (cart holds)',
+            StockReservation.objects.filter(product_id__in=[1, 2], expires_at__gt=now)
+            .values('product_id').annotate(held=Sum('quantity')),
+        ),
+        ('expire_reservations', StockReservation.objects.filter(expires_at__lte=now).order_by('expires_at')[:1000]),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the hot product, order and cart queries and fail if any of them '
+        'needs a full table scan or an in-memory sort (i.e. an index is missing).'
+    )
+
+    def handle(self, *args, **options):
+        problems = PLAN_PROBLEMS.get(connection.vendor)
+        if problems is None:
+            raise CommandError(f'Query plan checks are not implemented for {connection.vendor}')
+
+        failures = 0
+        for name, queryset in hot_queries():
+            plan = self.explain(queryset)
+            found = sorted({label for pattern, label in problems if pattern.search(plan)})
+            if found:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'FAIL {name}: {", ".join(found)}'))
+            else:
+                self.stdout.write(f'ok   {name}')
+            if found or options['verbosity'] > 1:
+                self.stdout.write('\n'.join(f'       {line}' for line in plan.splitlines()))
+
+        if failures:
+            raise CommandError(f'{failures} queries are not served by an index')
+        self.stdout.write(self.style.SUCCESS('All hot queries are served by indexes'))
+
+    def explain(self, queryset):
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        # Small tables make sequential scans cheapest, so make the planner
+        # prefer any usable index; a scan or sort left in the plan means none.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+            plan = queryset.explain()
+            transaction.set_rollback(True)
+        return plan
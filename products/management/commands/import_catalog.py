@@ -0,0 +1,237 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework import serializers
+from products import search, suggest
+from products.cache import bump_catalog_version
+from products.models import Category, Product, compute_discounted_price
+from products.serializers import ProductSerializer
+
+# Columns taken from each input row, validated with the ProductSerializer fields
+IMPORT_FIELDS = ['name', 'description', 'price', 'discount', 'stock', 'image_url']
+# Needed to insert a product; rows with an id only update the columns they carry
+REQUIRED_FIELDS = ('name', 'description', 'price')
+PRICE_FIELDS = ('price', 'discount')
+# Stored values proposed for the columns an update row leaves out
+UPDATE_FILL_FIELDS = IMPORT_FIELDS + ['category', 'discounted_price']
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream products from a CSV or JSON Lines file and upsert them in batches. '
+        'Rows with an "id" update only the columns they provide on that existing product, '
+        'rows without one are inserted. The "category" column holds the category name.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, or "-" for stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-categories',
+            action='store_true',
+            help='Create unknown categories instead of rejecting the row',
+        )
+        parser.add_argument('--rejects', help='Write rejected rows with their errors to this JSONL file')
+        parser.add_argument(
+            '--skip-search-index',
+            action='store_true',
+            help='Do not rebuild the full-text index afterwards (run rebuild_search_index later)',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        self.serializer = ProductSerializer()
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.create_categories = options['create_categories']
+
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        rejects = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else None
+
+        imported = rejected = batches = 0
+        started = time.monotonic()
+        batch = []
+        try:
+            for line_number, row in self.read_rows(stream, fmt):
+                try:
+                    product, fields = self.build_product(row)
+                except serializers.ValidationError as exc:
+                    rejected += 1
+                    self.reject(rejects, line_number, row, exc.detail)
+                    continue
+                batch.append((line_number, row, product, fields))
+
+                if len(batch) >= options['batch_size']:
+                    written, failed = self.write_batch(batch, rejects)
+                    imported += written
+                    rejected += failed
+                    batch = []
+                    batches += 1
+                    if batches % 10 == 0:
+                        self.report(imported, rejected, started)
+            written, failed = self.write_batch(batch, rejects)
+            imported += written
+            rejected += failed
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects:
+                rejects.close()
+
+        # bulk_create bypasses the Product signals, so refresh derived data in bulk
+        Category.objects.refresh_product_counts()
+        if not options['skip_search_index'] and search.is_supported():
+            search.rebuild_index()
+        bump_catalog_version()
+        suggest.bump_names_version()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} products, rejected {rejected} rows in {elapsed:.1f}s '
+            f'({imported / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
+
+    def read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            # DictReader line numbers start after the header
+            for line_number, row in enumerate(csv.DictReader(stream), start=2):
+                yield line_number, row
+            return
+
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = {'__raw__': line.rstrip('\n')}
+            yield line_number, row
+
+    def build_product(self, row):
+        """
+        Validate a row into an unsaved Product and the set of columns it provides.
+        Blank or missing columns fall back to the model defaults on insert and are
+        left untouched on update.
+        """
+        if not isinstance(row, dict) or '__raw__' in row:
+            raise serializers.ValidationError({'row': ['Invalid JSON object']})
+
+        product_id = row.get('id')
+        values = {}
+        errors = {}
+        for name in IMPORT_FIELDS:
+            raw = row.get(name)
+            if raw in (None, ''):
+                if name in REQUIRED_FIELDS and product_id in (None, ''):
+                    errors[name] = ['This field is required.']
+                continue
+            try:
+                # Same field-level and validate_<field> rules as the API
+                value = self.serializer.fields[name].run_validation(raw)
+                validator = getattr(self.serializer, f'validate_{name}', None)
+                values[name] = validator(value) if validator else value
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+
+        fields = set(values)
+        category_id = None
+        category_name = (row.get('category') or '').strip()
+        if category_name:
+            fields.add('category')
+            category_id = self.categories.get(category_name)
+            if category_id is None:
+                if self.create_categories:
+                    category_id = Category.objects.get_or_create(name=category_name)[0].pk
+                    self.categories[category_name] = category_id
+                else:
+                    errors['category'] = [f'Unknown category "{category_name}"']
+
+        if product_id not in (None, ''):
+            try:
+                product_id = int(product_id)
+            except (TypeError, ValueError):
+                errors['id'] = ['A valid integer is required.']
+        else:
+            product_id = None
+
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        product = Product(id=product_id, category_id=category_id, **values)
+        if product_id is None:
+            product.discounted_price = compute_discounted_price(product.price, product.discount)
+        return product, fields
+
+    def write_batch(self, batch, rejects):
+        """
+        Insert the new products and upsert the updates, one statement per distinct
+        set of provided columns so absent columns keep their stored values.
+        Returns (written, rejected).
+        """
+        if not batch:
+            return 0, 0
+
+        rejected = 0
+        inserts = []
+        updates = {}
+        with transaction.atomic():
+            ids = [product.id for _, _, product, _ in batch if product.id is not None]
+            # Only existing products are updated: inserting an explicit id would leave
+            # the PostgreSQL id sequence behind and break the next API insert
+            existing = {
+                row['id']: row
+                for row in Product.objects.filter(id__in=ids).values('id', *UPDATE_FILL_FIELDS)
+            }
+            for line_number, row, product, fields in batch:
+                if product.id is None:
+                    inserts.append(product)
+                    continue
+                current = existing.get(product.id)
+                if current is None:
+                    rejected += 1
+                    self.reject(rejects, line_number, row, {'id': [f'Product {product.id} does not exist']})
+                    continue
+
+                # The upsert still proposes a full row, so fill it from the stored one
+                for name in UPDATE_FILL_FIELDS:
+                    if name not in fields and name != 'category':
+                        setattr(product, name, current[name])
+                if 'category' not in fields:
+                    product.category_id = current['category']
+                fields = set(fields)
+                if fields.intersection(PRICE_FIELDS):
+                    product.discounted_price = compute_discounted_price(product.price, product.discount)
+                    fields.add('discounted_price')
+                fields.add('updated_at')
+                updates.setdefault(frozenset(fields), []).append(product)
+
+            if inserts:
+                Product.objects.bulk_create(inserts)
+            for fields, products in updates.items():
+                Product.objects.bulk_create(
+                    products,
+                    update_conflicts=True,
+                    unique_fields=['id'],
+                    update_fields=sorted(fields),
+                )
+        return len(batch) - rejected, rejected
+
+    def reject(self, rejects, line_number, row, errors):
+        if rejects:
+            rejects.write(json.dumps({'line': line_number, 'errors': errors, 'row': row}, default=str) + '\n')
+        else:
+            self.stderr.write(f'Line {line_number}: {json.dumps(errors, default=str)}')
+
+    def report(self, imported, rejected, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{imported} imported, {rejected} rejected '
+            f'({imported / elapsed if elapsed else 0:.0f} rows/s)'
+        )
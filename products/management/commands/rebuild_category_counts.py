@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized Category.product_count column in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category',
+            action='append',
+            dest='categories',
+            default=[],
+            help='Only rebuild the named category (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        categories = Category.objects.all()
+        if options['categories']:
+            categories = categories.filter(name__in=options['categories'])
+
+        updated = categories.refresh_product_counts()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt product counts for {updated} categories'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index from the products table'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Full-text search is only available on PostgreSQL and SQLite')
+
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Product search index rebuilt'))
@@ -0,0 +1,57 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE products ADD COLUMN search_vector tsvector')
+        schema_editor.execute(
+            """
+            UPDATE products SET search_vector =
+                setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'B')
+            """
+        )
+        schema_editor.execute(
+            'CREATE INDEX products_search_vector_gin ON products USING GIN (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE products_fts USING fts5(name, description, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            'INSERT INTO products_fts (rowid, name, description) SELECT id, name, description FROM products'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS products_search_vector_gin')
+        schema_editor.execute('ALTER TABLE products DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS products_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='products.product')),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+            ],
+            options={
+                'db_table': 'products_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:45
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_product_counts(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    counts = (
+        Product.objects.filter(category=OuterRef('pk'))
+        .order_by()
+        .values('category')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Category.objects.update(
+        product_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Denormalized number of products, maintained by products.signals'),
+        ),
+        migrations.RunPython(populate_product_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:45
+
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from django.db import migrations, models
+
+
+def populate_discounted_price(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    batch = []
+    for product in Product.objects.only('id', 'price', 'discount').iterator(chunk_size=2000):
+        price = product.price
+        if product.discount > 0:
+            price -= (price * product.discount) / 100
+        product.discounted_price = price.quantize(Decimal('0.01'), rounding=ROUND_HALF_EVEN)
+        batch.append(product)
+        if len(batch) == 2000:
+            Product.objects.bulk_update(batch, ['discounted_price'])
+            batch = []
+    Product.objects.bulk_update(batch, ['discounted_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_category_product_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discounted_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, help_text='Price after discount, recomputed on every save', max_digits=10),
+        ),
+        migrations.RunPython(populate_discounted_price, migrations.RunPython.noop),
+    ]
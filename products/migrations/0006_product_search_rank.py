@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def configure_rank(apps, schema_editor):
+    # Store the name/description weights as the FTS5 table's own `rank`, so
+    # searches can ORDER BY rank inside products_fts
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("INSERT INTO products_fts (products_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+
+
+def reset_rank(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("INSERT INTO products_fts (products_fts, rank) VALUES ('rank', 'bm25()')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(configure_rank, reset_rank),
+    ]
@@ -1,16 +1,68 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
 from django.db import models
+from django.db.models import DEFERRED, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def compute_discounted_price(price, discount):
+    """Price after a percentage discount, rounded to cents"""
+    price = Decimal(str(price))
+    discount = Decimal(str(discount or 0))
+    if discount > 0:
+        price -= (price * discount) / 100
+    return price.quantize(Decimal('0.01'), rounding=ROUND_HALF_EVEN)
+
+
+class CategoryQuerySet(models.QuerySet):
+    def refresh_product_counts(self):
+        """Recompute product_count for these categories in a single UPDATE"""
+        counts = (
+            Product.objects.filter(category=OuterRef('pk'))
+            .order_by()
+            .values('category')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.update(
+            product_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+        )
 
 
 class Category(models.Model):
     """Product Category model"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
+    product_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Denormalized number of products, maintained by products.signals"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted name so signals can skip saves that keep it
+        instance._loaded_name = instance.__dict__.get('name', DEFERRED)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Never write back a stale product_count loaded with the instance;
+        # the counter is only changed through F() updates.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'product_count'
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         db_table = 'categories'
         verbose_name = 'Category'
@@ -37,19 +89,35 @@ class Product(models.Model):
         default=0,
         help_text="Discount percentage (0-100)"
     )
+    discounted_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        db_index=True,
+        help_text="Price after discount, recomputed on every save"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
-    @property
-    def discounted_price(self):
-        """Calculate price after discount"""
-        if self.discount > 0:
-            discount_amount = (self.price * self.discount) / 100
-            return self.price - discount_amount
-        return self.price
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted category and name so signals can detect changes
+        instance._loaded_category_id = instance.__dict__.get('category_id', DEFERRED)
+        instance._loaded_name = instance.__dict__.get('name', DEFERRED)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keep the stored effective price consistent with price and discount
+        self.discounted_price = compute_discounted_price(self.price, self.discount)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'discount'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'discounted_price'}
+        super().save(*args, **kwargs)
 
     @property
     def is_in_stock(self):
@@ -61,3 +129,30 @@ class Product(models.Model):
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
         ordering = ['-created_at']
+        indexes = [
+            # Default listing order, with the pk tie-breaker used by keyset pagination
+            models.Index(fields=['-created_at', '-id'], name='products_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='products_category_created_idx'),
+        ]
+
+
+class ProductSearchEntry(models.Model):
+    """
+    Read-only view of the SQLite FTS5 shadow table used by products.search.
+
+    The table itself is created by migration and maintained from the Product
+    signals; the model only exists so searches can join it on rowid.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_entry'
+    )
+    name = models.TextField()
+    description = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'products_fts'
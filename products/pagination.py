@@ -0,0 +1,209 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination using seek predicates instead of OFFSET.
+
+    The page boundary is stored in the cursor as the values of every ordering
+    column of the last row (plus the primary key as a tie-breaker), so the
+    next page is fetched with `WHERE (created_at, id) < (...)` and costs the
+    same as the first page. Works with whatever ordering the filter backends
+    (OrderingFilter, search ranking) left on the queryset.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self._model_meta = queryset.model._meta
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor['reverse'])
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [(name, not descending) for name, descending in ordering]
+
+        queryset = queryset.order_by(*[
+            f'-{name}' if descending else name for name, descending in ordering
+        ])
+        if cursor:
+            queryset = queryset.filter(self.seek_filter(ordering, cursor['position']))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        if self.reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.next_position = self.get_position(results[-1]) if results and self.has_next else None
+        self.previous_position = self.get_position(results[0]) if results and self.has_previous else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+                if page_size > 0:
+                    return min(page_size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """
+        Return the queryset ordering as `(field, descending)` pairs, with the
+        primary key appended so every position is unique.
+        """
+        query = queryset.query
+        order_by = query.order_by or query.get_meta().ordering or ['-pk']
+        pk_name = query.get_meta().pk.name
+
+        ordering = []
+        for field in order_by:
+            if isinstance(field, OrderBy) and isinstance(field.expression, F):
+                ordering.append((field.expression.name, field.descending))
+            elif isinstance(field, str) and field != '?':
+                ordering.append((field.lstrip('-'), field.startswith('-')))
+            else:
+                raise ValueError(f'Cannot paginate by keyset on ordering {field!r}')
+
+        ordering = [('pk' if name == pk_name else name, descending) for name, descending in ordering]
+        if 'pk' not in [name for name, _ in ordering]:
+            ordering.append(('pk', ordering[0][1]))
+        return ordering
+
+    def seek_filter(self, ordering, position):
+        """
+        Build the row-value comparison `(a, b, pk) > (x, y, z)` as an
+        expanded OR of prefixes, so mixed ASC/DESC orderings are supported.
+        """
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(ordering, position):
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_position(self, row):
+        position = []
+        for name, _ in self.ordering:
+            if isinstance(row, dict):
+                value = row['id' if name == 'pk' else name]
+            else:
+                value = row
+                for attr in name.split('__'):
+                    value = getattr(value, attr) if value is not None else None
+            position.append(value)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        payload = {
+            'o': [f'-{name}' if descending else name for name, descending in self.ordering],
+            'p': [self._encode_value(value) for value in position],
+        }
+        if reverse:
+            payload['r'] = 1
+        token = b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+
+        try:
+            payload = json.loads(b64decode(token.encode('ascii')).decode('utf-8'))
+            ordering = [f'-{name}' if descending else name for name, descending in self.ordering]
+            if payload['o'] != ordering or len(payload['p']) != len(ordering):
+                raise ValueError
+            position = [
+                self._decode_value(name, value)
+                for (name, _), value in zip(self.ordering, payload['p'])
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return {'position': position, 'reverse': bool(payload.get('r'))}
+
+    def _encode_value(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def _decode_value(self, name, value):
+        if value is None:
+            return None
+        field = self._resolve_field(name)
+        if field is None:
+            # Annotations (e.g. search rank) round-trip through JSON as-is.
+            return value
+        return field.to_python(value)
+
+    def _resolve_field(self, name):
+        meta = self._model_meta
+        field = None
+        for part in name.split('__'):
+            try:
+                field = meta.pk if part == 'pk' else meta.get_field(part)
+            except FieldDoesNotExist:
+                return None
+            if field.is_relation:
+                meta = field.related_model._meta
+        if field is not None and field.is_relation:
+            field = field.target_field
+        return field
@@ -0,0 +1,177 @@
+"""
+Full-text product search.
+
+PostgreSQL keeps a weighted `tsvector` column (`products.search_vector`) with
+a GIN index; SQLite keeps an FTS5 shadow table (`products_fts`, joined through
+the unmanaged ProductSearchEntry model) keyed by product id. Both are created
+by migration 0002 and kept in sync from the Product save/delete signals. Other
+database vendors fall back to DRF's `icontains` search.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+FTS_TABLE = 'products_fts'
+TS_CONFIG = 'english'
+RANK_ANNOTATION = 'search_rank'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_supported():
+    return connection.vendor in ('postgresql', 'sqlite')
+
+
+def tokenize(terms):
+    """Split search terms into lower-cased word tokens safe to embed in a query"""
+    tokens = []
+    for term in terms:
+        tokens.extend(token.lower() for token in _TOKEN_RE.findall(term))
+    return tokens
+
+
+def rank_ordering():
+    """The order_by() term that puts the most relevant results first"""
+    return RANK_ANNOTATION if connection.vendor == 'sqlite' else f'-{RANK_ANNOTATION}'
+
+
+def search(queryset, terms, rank=True):
+    """
+    Restrict `queryset` to products matching every token (as a prefix) and,
+    if `rank` is set, annotate it with `search_rank`. Higher is more relevant
+    on PostgreSQL and lower on SQLite; order with `rank_ordering()`.
+    """
+    tokens = tokenize(terms)
+    if not tokens:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        queryset = queryset.filter(
+            RawSQL(
+                f"products.search_vector @@ to_tsquery('{TS_CONFIG}', %s)",
+                (query,),
+                output_field=BooleanField(),
+            )
+        )
+        if not rank:
+            return queryset
+        return queryset.annotate(**{
+            RANK_ANNOTATION: RawSQL(
+                f"ts_rank(products.search_vector, to_tsquery('{TS_CONFIG}', %s))",
+                (query,),
+                output_field=FloatField(),
+            )
+        })
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        queryset = queryset.filter(
+            search_entry__isnull=False,
+        ).filter(
+            RawSQL(f'{FTS_TABLE} MATCH %s', (match,), output_field=BooleanField())
+        )
+        if not rank:
+            return queryset
+        return queryset.annotate(**{
+            # FTS5's own rank column (bm25 with the weights set by migration
+            # 0006, lower is better) is scored inside the virtual table
+            # instead of calling bm25() again for every joined row
+            RANK_ANNOTATION: RawSQL(f'{FTS_TABLE}.rank', (), output_field=FloatField())
+        })
+
+    query = Q()
+    for token in tokens:
+        query &= Q(name__icontains=token) | Q(description__icontains=token)
+    return queryset.filter(query)
+
+
+def index_products(product_ids):
+    """Refresh the search index entries for the given product ids"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"""
+                UPDATE products SET search_vector =
+                    setweight(to_tsvector('{TS_CONFIG}', coalesce(name, '')), 'A') ||
+                    setweight(to_tsvector('{TS_CONFIG}', coalesce(description, '')), 'B')
+                WHERE id = ANY(%s)
+                """,
+                [product_ids],
+            )
+        elif connection.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+                f'SELECT id, name, description FROM products WHERE id IN ({placeholders})',
+                product_ids,
+            )
+
+
+def unindex_products(product_ids):
+    """Drop search index entries for deleted products"""
+    product_ids = list(product_ids)
+    if not product_ids or connection.vendor != 'sqlite':
+        # The PostgreSQL vector lives on the product row and goes with it.
+        return
+
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+
+def rebuild_index():
+    """Rebuild the whole search index from the products table"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"""
+                UPDATE products SET search_vector =
+                    setweight(to_tsvector('{TS_CONFIG}', coalesce(name, '')), 'A') ||
+                    setweight(to_tsvector('{TS_CONFIG}', coalesce(description, '')), 'B')
+                """
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+                f'SELECT id, name, description FROM products'
+            )
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on `?search=` that uses the
+    full-text index and annotates results with `search_rank`.
+    """
+    rank = True
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        if not is_supported():
+            return super().filter_queryset(request, queryset, view)
+        return search(queryset, terms, rank=self.rank)
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that defaults to relevance order for search results"""
+
+    def get_default_ordering(self, view):
+        request = getattr(view, 'request', None)
+        if (
+            request is not None
+            and is_supported()
+            and tokenize(filters.SearchFilter().get_search_terms(request))
+        ):
+            return [rank_ordering()]
+        return super().get_default_ordering(view)
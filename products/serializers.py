@@ -1,22 +1,119 @@
+import decimal
+import functools
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from .models import Category, Product
 
 
+class SparseFieldsetMixin:
+    """
+    Serializer mixin for sparse fieldsets.
+
+    The top-level serializer of a request honours `?fields=a,b` (keep only
+    those) and `?omit=c,d` (drop those); `?view=compact` selects
+    `Meta.compact_fields` when the serializer defines it. The same selection
+    can be passed explicitly with the `fields=` / `omit=` keyword arguments.
+    Nested serializers are declared without a request and keep all fields.
+    The selection only shapes the output: a serializer given `data=` keeps
+    every field for validation and trims its representation instead.
+    """
+
+    # Model columns a serializer field reads when it is not a plain model
+    # field of the same name, e.g. {'is_in_stock': ['stock']}
+    column_dependencies = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        omit = kwargs.pop('omit', None)
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if fields is None and omit is None and request is not None:
+            fields, omit = self.get_requested_fields(request.query_params)
+
+        self._output_selection = None
+        if fields is None and omit is None:
+            return
+        if hasattr(self, 'initial_data'):
+            self._output_selection = (fields, omit)
+            return
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in omit or ():
+            self.fields.pop(name, None)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self._output_selection is None:
+            return data
+        fields, omit = self._output_selection
+        for name in list(data):
+            if (fields is not None and name not in fields) or name in (omit or ()):
+                del data[name]
+        return data
+
+    @classmethod
+    def get_requested_fields(cls, query_params):
+        """Return the `(fields, omit)` selection asked for in the query string"""
+        fields = omit = None
+        if query_params.get('view') == 'compact' and hasattr(cls.Meta, 'compact_fields'):
+            fields = list(cls.Meta.compact_fields)
+        if query_params.get('fields'):
+            fields = [name.strip() for name in query_params['fields'].split(',') if name.strip()]
+        if query_params.get('omit'):
+            omit = [name.strip() for name in query_params['omit'].split(',') if name.strip()]
+        return fields, omit
+
+    @classmethod
+    def get_selected_fields(cls, query_params):
+        """Names of the fields the query string selects, in declaration order"""
+        fields, omit = cls.get_requested_fields(query_params)
+        return [
+            name for name in cls.Meta.fields
+            if (fields is None or name in fields) and name not in (omit or ())
+        ]
+
+    @classmethod
+    def get_selected_columns(cls, query_params):
+        """
+        Model columns needed for the requested fieldset, for use with
+        `QuerySet.only()`, or None when every field is requested.
+        """
+        if cls.get_requested_fields(query_params) == (None, None):
+            return None
+
+        model_fields = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        columns = {cls.Meta.model._meta.pk.name}
+        for name in cls.get_selected_fields(query_params):
+            if name in cls.column_dependencies:
+                columns.update(cls.column_dependencies[name])
+            elif name in model_fields:
+                columns.add(name)
+        return sorted(columns)
+
+
 class CategorySerializer(serializers.ModelSerializer):
     """Serializer for Category model"""
-    products_count = serializers.SerializerMethodField()
+    products_count = serializers.IntegerField(source='product_count', read_only=True)
 
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'products_count', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-    def get_products_count(self, obj):
-        return obj.products.count()
-
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Product model"""
+    column_dependencies = {
+        'category_name': ['category', 'category__name'],
+        'is_in_stock': ['stock'],
+    }
+
     category_name = serializers.CharField(source='category.name', read_only=True)
     discounted_price = serializers.DecimalField(
         max_digits=10, 
@@ -33,6 +130,11 @@ class ProductSerializer(serializers.ModelSerializer):
             'discount', 'is_in_stock', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # Grid/listing representation selected with ?view=compact
+        compact_fields = [
+            'id', 'name', 'category_name', 'price', 'discounted_price',
+            'image_url', 'is_in_stock'
+        ]
 
     def validate_discount(self, value):
         if value < 0 or value > 100:
@@ -48,3 +150,177 @@ class ProductSerializer(serializers.ModelSerializer):
         if value <= 0:
             raise serializers.ValidationError("Price must be greater than zero")
         return value
+
+
+class BulkProductUpdateItemSerializer(serializers.Serializer):
+    """One row of an inventory sync: absolute stock or a stock delta, price, discount"""
+    id = serializers.IntegerField()
+    stock = serializers.IntegerField(required=False)
+    stock_delta = serializers.IntegerField(required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    discount = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+
+    validate_discount = ProductSerializer.validate_discount
+    validate_stock = ProductSerializer.validate_stock
+    validate_price = ProductSerializer.validate_price
+
+    def validate(self, attrs):
+        if 'stock' in attrs and 'stock_delta' in attrs:
+            raise serializers.ValidationError("Provide either stock or stock_delta, not both")
+        if not {'stock', 'stock_delta', 'price', 'discount'} & set(attrs):
+            raise serializers.ValidationError("Nothing to update")
+        return attrs
+
+
+# ProductSerializer field -> (values() column, conversion) for ProductRowSerializer
+PRODUCT_ROW_FIELDS = {
+    'id': ('id', None),
+    'name': ('name', None),
+    'description': ('description', None),
+    'category': ('category_id', None),
+    # DRF skips `source='category.name'` entirely when category is None
+    'category_name': ('category__name', 'category'),
+    'price': ('price', 'decimal'),
+    'discounted_price': ('discounted_price', 'decimal'),
+    'image_url': ('image_url', None),
+    'stock': ('stock', None),
+    'discount': ('discount', 'decimal'),
+    'is_in_stock': ('stock', 'in_stock'),
+    'created_at': ('created_at', 'datetime'),
+    'updated_at': ('updated_at', 'datetime'),
+}
+
+
+def _decimal_converter(field):
+    if (
+        not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        or field.localize
+        or field.normalize_output
+        or field.decimal_places is None
+    ):
+        return lambda value, tz: field.to_representation(value)
+
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value, tz):
+        return f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if (
+        output_format is None
+        or output_format.lower() != 'iso-8601'
+        or hasattr(field, 'timezone')
+        or not settings.USE_TZ
+    ):
+        return lambda value, tz: field.to_representation(value)
+
+    def convert(value, tz):
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _in_stock(value, tz):
+    return value > 0
+
+
+@functools.lru_cache(maxsize=None)
+def _product_row_function(field_names):
+    """
+    Build `convert(row, tz)` returning the output dict for `field_names`, with
+    the per-field lookups resolved once so serializing a row is one call.
+    """
+    fields = ProductSerializer().fields
+    entries = []
+    for name in field_names:
+        column, kind = PRODUCT_ROW_FIELDS[name]
+        if kind == 'decimal':
+            converter = _decimal_converter(fields[name])
+        elif kind == 'datetime':
+            converter = _datetime_converter(fields[name])
+        elif kind == 'in_stock':
+            converter = _in_stock
+        else:
+            converter = None
+        entries.append((name, column, converter))
+    entries = tuple(entries)
+    drop_category_name = 'category_name' in field_names
+
+    def convert(row, tz):
+        data = {
+            name: row[column] if converter is None else converter(row[column], tz)
+            for name, column, converter in entries
+        }
+        if drop_category_name and row['category_id'] is None:
+            del data['category_name']
+        return data
+    return convert
+
+
+class ProductRowSerializer:
+    """
+    Read-only fast path for product listings.
+
+    Produces exactly the output of `ProductSerializer(...).data` for the same
+    field selection, but from `values()` rows (or plain model instances via
+    `row_from_instance`) and without per-field serializer machinery.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = tuple(fields if fields is not None else ProductSerializer.Meta.fields)
+        columns = {PRODUCT_ROW_FIELDS[name][0] for name in self.fields}
+        if 'category_name' in self.fields:
+            columns.add('category_id')
+        self.columns = sorted(columns)
+        self._convert = _product_row_function(self.fields)
+
+    @staticmethod
+    def current_timezone():
+        return timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def to_representation(self, row):
+        return self._convert(row, self.current_timezone())
+
+    def serialize(self, rows):
+        convert = self._convert
+        tz = self.current_timezone()
+        return [convert(row, tz) for row in rows]
+
+    @staticmethod
+    def row_from_instance(product):
+        """Build the values() row for a product instance (category should be loaded)"""
+        return {
+            'id': product.id,
+            'name': product.name,
+            'description': product.description,
+            'category_id': product.category_id,
+            'category__name': product.category.name if product.category_id is not None else None,
+            'price': product.price,
+            'discounted_price': product.discounted_price,
+            'image_url': product.image_url,
+            'stock': product.stock,
+            'discount': product.discount,
+            'created_at': product.created_at,
+            'updated_at': product.updated_at,
+        }
+
+
+class ProductDetailsField(serializers.Field):
+    """Read-only nested product representation rendered through ProductRowSerializer"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+        self.row_serializer = ProductRowSerializer()
+
+    def to_representation(self, product):
+        return self.row_serializer.to_representation(ProductRowSerializer.row_from_instance(product))
@@ -0,0 +1,89 @@
+from django.db.models import DEFERRED, F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .cache import bump_catalog_version
+from .models import Category, Product
+from . import search, suggest
+
+
+def adjust_product_count(category_id, delta):
+    """Apply an incremental change to a category's denormalized product_count"""
+    if category_id is None or not delta:
+        return
+    categories = Category.objects.filter(pk=category_id)
+    if delta < 0:
+        categories = categories.filter(product_count__gte=-delta)
+    categories.update(product_count=F('product_count') + delta)
+
+
+@receiver(pre_save, sender=Product)
+def capture_previous_category(sender, instance, update_fields=None, **kwargs):
+    """Capture the persisted category before saving"""
+    if instance.pk is None or (update_fields is not None and 'category' not in update_fields):
+        instance._previous_category_id = DEFERRED
+        return
+
+    previous = getattr(instance, '_loaded_category_id', DEFERRED)
+    if previous is DEFERRED:
+        # Not loaded from the database (or category was deferred)
+        previous = Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+    instance._previous_category_id = previous
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts(sender, instance, created, **kwargs):
+    """Keep Category.product_count current when products are added or moved"""
+    previous = None if created else getattr(instance, '_previous_category_id', DEFERRED)
+    if previous is not DEFERRED and previous != instance.category_id:
+        adjust_product_count(previous, -1)
+        adjust_product_count(instance.category_id, 1)
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text index in sync with name/description changes"""
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Remove deleted products from the full-text index"""
+    search.unindex_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def decrement_category_count(sender, instance, **kwargs):
+    """Keep Category.product_count current when products are deleted"""
+    adjust_product_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Any catalog write makes every cached catalog response stale"""
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def update_suggestions(sender, instance, created, update_fields=None, **kwargs):
+    """Keep this process's autocomplete index current when a name changes"""
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    if not created and getattr(instance, '_loaded_name', DEFERRED) == instance.name:
+        return
+    kind = 'product' if sender is Product else 'category'
+    suggest.record_change(kind, instance.pk, instance.name)
+    instance._loaded_name = instance.name
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def remove_suggestions(sender, instance, **kwargs):
+    kind = 'product' if sender is Product else 'category'
+    suggest.record_change(kind, instance.pk)
@@ -0,0 +1,207 @@
+"""
+Per-process prefix index for search-as-you-type suggestions.
+
+Product and category names are normalized and stored in one sorted list,
+once per word (so "pro" finds "iPhone 15 Pro"), and looked up with bisect.
+The index is built on first use and kept current from the Product/Category
+signals. Only name changes matter here, so it follows its own names version
+rather than the catalog version that every stock or price write bumps. A
+names version it did not apply itself (another worker, an import) makes the
+next lookup start a rebuild in a background thread and keep answering from
+the current index until the new one is ready.
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+NAMES_VERSION_KEY = 'suggest:names_version'
+
+
+def get_names_version():
+    version = cache.get(NAMES_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a version lost to eviction never repeats
+        cache.add(NAMES_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(NAMES_VERSION_KEY)
+    return version
+
+
+def bump_names_version():
+    """Mark every process's index stale once the current transaction commits"""
+    transaction.on_commit(_bump_names_version)
+
+
+def _bump_names_version():
+    try:
+        cache.incr(NAMES_VERSION_KEY)
+    except ValueError:
+        get_names_version()
+
+
+def normalize(text):
+    """Lower-case, strip accents and collapse punctuation to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(_WORD_RE.findall(text.casefold()))
+
+
+class PrefixIndex:
+    """
+    Sorted `(key, word_position, kind, id, label)` entries; every entry whose
+    key starts with the query sits in one contiguous run found with bisect.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.entries = []
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, version):
+        index = cls(version)
+        entries = []
+        for kind, queryset in (('category', Category.objects.all()), ('product', Product.objects.all())):
+            for pk, name in queryset.values_list('id', 'name').iterator(chunk_size=5000):
+                keys = index._make_entries(kind, pk, name)
+                index._keys[kind, pk] = keys
+                entries.extend(keys)
+        entries.sort()
+        index.entries = entries
+        return index
+
+    @staticmethod
+    def _make_entries(kind, pk, name):
+        words = normalize(name).split(' ')
+        return [
+            (' '.join(words[position:]), position, kind, pk, name)
+            for position in range(len(words)) if words[position]
+        ]
+
+    def add(self, kind, pk, name):
+        with self._lock:
+            self._remove(kind, pk)
+            keys = self._make_entries(kind, pk, name)
+            self._keys[kind, pk] = keys
+            for entry in keys:
+                insort(self.entries, entry)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._remove(kind, pk)
+
+    def _remove(self, kind, pk):
+        for entry in self._keys.pop((kind, pk), ()):
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+
+    def lookup(self, query, limit=10, scan_limit=None):
+        """
+        Return up to `limit` `(kind, id, label)` matches for the normalized
+        prefix `query`, preferring names that start with it, then shorter names.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        entries = self.entries
+        scan_limit = scan_limit or limit * 20
+        best = {}
+        position = bisect_left(entries, (query,))
+        while position < len(entries) and len(best) < scan_limit:
+            key, word_position, kind, pk, label = entries[position]
+            if not key.startswith(query):
+                break
+            rank = (word_position > 0, kind != 'category', len(label), label)
+            if (kind, pk) not in best or rank < best[kind, pk][0]:
+                best[kind, pk] = (rank, label)
+            position += 1
+
+        ranked = sorted(best.items(), key=lambda item: item[1][0])
+        return [(kind, pk, label) for (kind, pk), (_, label) in ranked[:limit]]
+
+
+_index = None
+_build_lock = threading.Lock()
+_refreshing = False
+
+
+def get_index():
+    """
+    Return the process-wide index. The first call builds it; later calls that
+    find it behind the names version refresh it in the background.
+    """
+    global _index
+    version = get_names_version()
+    index = _index
+    if index is None:
+        with _build_lock:
+            if _index is None:
+                _index = PrefixIndex.build(version)
+            index = _index
+    elif index.version != version:
+        _start_refresh()
+    return index
+
+
+def _start_refresh():
+    global _refreshing
+    with _build_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target=_refresh, name='suggest-refresh', daemon=True).start()
+
+
+def _refresh():
+    global _index, _refreshing
+    try:
+        # Read the version first so writes during the build trigger another refresh
+        _index = PrefixIndex.build(get_names_version())
+    except Exception:
+        logger.exception('Rebuilding the suggestion index failed')
+    finally:
+        connection.close()
+        with _build_lock:
+            _refreshing = False
+
+
+def suggest(query, limit=10):
+    return get_index().lookup(query, limit)
+
+
+def record_change(kind, pk, name=None):
+    """
+    Apply a product/category write to this process's index once it commits.
+
+    Registered after the names version bump for the same write, so if the
+    version moved by exactly one step it was this write and the index can
+    adopt it instead of rebuilding.
+    """
+    bump_names_version()
+
+    def apply():
+        index = _index
+        if index is None:
+            return
+        if name is None:
+            index.remove(kind, pk)
+        else:
+            index.add(kind, pk, name)
+        version = get_names_version()
+        if index.version is not None and version == index.version + 1:
+            index.version = version
+
+    transaction.on_commit(apply)
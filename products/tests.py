@@ -0,0 +1,45 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from . import suggest
+from .models import Category, Product
+
+
+class CheckQueryPlansTests(TestCase):
+    def test_hot_queries_are_served_by_indexes(self):
+        # Raises CommandError naming the query if a migration drops an index it relies on
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('All hot queries are served by indexes', out.getvalue())
+
+
+class SuggestNamesVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Dairy')
+        cls.product = Product.objects.create(name='Milk', description='1 litre', price=10, stock=5)
+
+    def assertNamesVersionBumps(self, save, bumped):
+        before = suggest.get_names_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            save()
+        self.assertEqual(suggest.get_names_version() != before, bumped)
+
+    def test_saves_that_keep_the_name_do_not_bump(self):
+        category = Category.objects.get(pk=self.category.pk)
+        category.description = 'Milk and cheese'
+        self.assertNamesVersionBumps(category.save, False)
+
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock = 3
+        self.assertNamesVersionBumps(product.save, False)
+
+    def test_renames_bump(self):
+        category = Category.objects.get(pk=self.category.pk)
+        category.name = 'Dairy & Eggs'
+        self.assertNamesVersionBumps(category.save, True)
+
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = 'Oat milk'
+        self.assertNamesVersionBumps(product.save, True)
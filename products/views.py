@@ -1,18 +1,41 @@
-from rest_framework import viewsets, filters
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser
+from rest_framework import viewsets, filters, serializers, status
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly, IsAdminUser
+from rest_framework.response import Response
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, IntegerField, Q, Value, When
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer
+from .cache import CatalogCacheMixin, bump_catalog_version, get_catalog_version
+from .export import EXPORT_FORMATS, export_catalog
+from .filters import ProductFilter
+from .models import Category, Product, compute_discounted_price
+from .pagination import KeysetPagination
+from .search import ProductSearchFilter, RankedOrderingFilter
+from . import suggest
+from .serializers import (
+    BulkProductUpdateItemSerializer,
+    CategorySerializer,
+    ProductRowSerializer,
+    ProductSerializer,
+)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """
     ViewSet for Category CRUD operations
-    List and retrieve are public, create/update/delete require admin
+    List and retrieve are public (and cached for anonymous clients),
+    create/update/delete require admin
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
@@ -24,32 +47,282 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """
     ViewSet for Product CRUD operations
-    List and retrieve are public, create/update/delete require admin
-    Supports filtering by category
+    List and retrieve are public (and cached for anonymous clients),
+    create/update/delete require admin
+    Supports filtering by category and effective (discounted) price range
     """
     queryset = Product.objects.select_related('category').all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'category__name']
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, RankedOrderingFilter]
+    filterset_class = ProductFilter
     search_fields = ['name', 'description']
-    ordering_fields = ['name', 'price', 'created_at', 'stock']
+    ordering_fields = ['name', 'price', 'discounted_price', 'created_at', 'stock']
     ordering = ['-created_at']
+    bulk_update_max_rows = 5000
+    bulk_update_chunk_size = 500
+    # Lower bounds of the price facet bands, on the discounted price
+    facet_price_bounds = [0, 100, 250, 500, 1000, 5000]
+    # Query parameters that do not change which products match
+    facet_ignored_params = {'cursor', 'page_size', 'ordering', 'fields', 'omit', 'view', 'format'}
+    suggest_limit = 10
+    suggest_max_limit = 20
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        # Only load the columns the requested sparse fieldset needs
+        if self.action == 'retrieve':
+            columns = self.get_serializer_class().get_selected_columns(self.request.query_params)
+            if columns is not None:
+                queryset = queryset.only(*columns)
+                if 'category__name' not in columns:
+                    queryset = queryset.select_related(None)
+
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(self.list_rows, request, *args, **kwargs)
+
+    def list_rows(self, request, *args, **kwargs):
+        """
+        List products from values() rows through ProductRowSerializer; the
+        output is identical to ProductSerializer but skips model instances
+        and per-field serializer overhead.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        row_serializer = ProductRowSerializer(
+            self.get_serializer_class().get_selected_fields(request.query_params)
+        )
+
+        # The paginator reads its cursor position from the ordering columns
+        columns = set(row_serializer.columns) | {'id'}
+        for name in queryset.query.order_by:
+            name = name.lstrip('-')
+            columns.add('id' if name == 'pk' else name)
+        rows = queryset.values(*columns)
 
-    # def get_queryset(self):
-    #     queryset = super().get_queryset()
-        
-    #     # Filter by category name using query parameter
-    #     category = self.request.query_params.get('category', None)
-    #     if category:
-    #         queryset = queryset.filter(category__name__iexact=category)
-        
-    #     return queryset
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(row_serializer.serialize(page))
+        return Response(row_serializer.serialize(rows))
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdminUser()]
         return super().get_permissions()
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Category, price band and availability counts for the products matching
+        the same filters and ?search= as the list, from one grouped query.
+        """
+        params = sorted(
+            (key, value) for key, values in request.query_params.lists()
+            if key not in self.facet_ignored_params for value in values
+        )
+        cache_key = 'catalog:facets:{}:{}'.format(
+            get_catalog_version(),
+            hashlib.sha256(repr(params).encode('utf-8')).hexdigest(),
+        )
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.compute_facets(request)
+            cache.set(cache_key, data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        return Response(data, status=status.HTTP_200_OK)
+
+    def compute_facets(self, request):
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_queryset(), self)
+        search_filter = ProductSearchFilter()
+        search_filter.rank = False
+        queryset = search_filter.filter_queryset(request, queryset, self)
+
+        bands = list(zip(self.facet_price_bounds, self.facet_price_bounds[1:] + [None]))
+        band_counts = {}
+        for index, (low, high) in enumerate(bands):
+            condition = Q(discounted_price__gte=low)
+            if high is not None:
+                condition &= Q(discounted_price__lt=high)
+            band_counts[f'price_band_{index}'] = Count('pk', filter=condition)
+
+        # One row per category carrying every conditional count
+        rows = list(
+            queryset.order_by()
+            .values('category_id', 'category__name')
+            .annotate(total=Count('pk'), in_stock=Count('pk', filter=Q(stock__gt=0)), **band_counts)
+        )
+
+        total = sum(row['total'] for row in rows)
+        in_stock = sum(row['in_stock'] for row in rows)
+        return {
+            'total': total,
+            'categories': sorted(
+                (
+                    {'id': row['category_id'], 'name': row['category__name'], 'count': row['total']}
+                    for row in rows
+                ),
+                key=lambda category: (-category['count'], category['name'] or ''),
+            ),
+            'price_ranges': [
+                {
+                    'min': low,
+                    'max': high,
+                    'count': sum(row[f'price_band_{index}'] for row in rows),
+                }
+                for index, (low, high) in enumerate(bands)
+            ],
+            'availability': {'in_stock': in_stock, 'out_of_stock': total - in_stock},
+        }
+
+    @action(detail=False, methods=['get'], authentication_classes=[], permission_classes=[AllowAny])
+    def suggest(self, request):
+        """
+        Autocomplete product and category names by prefix (?q=, ?limit=).
+        Answered from an in-process index, without authentication or queries.
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', self.suggest_limit)), self.suggest_max_limit)
+        except ValueError:
+            limit = self.suggest_limit
+
+        results = [
+            {'type': kind, 'id': pk, 'name': name}
+            for kind, pk, name in suggest.suggest(query, max(limit, 1))
+        ]
+        return Response({'query': query, 'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Stream every product matching the list filters as JSON Lines or CSV
+        (?type=jsonl|csv, ?gzip=1), without loading the catalog into memory.
+        """
+        fmt = request.query_params.get('type', 'jsonl')
+        if fmt not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'type must be one of: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        compress = request.query_params.get('gzip') in ('1', 'true')
+
+        queryset = DjangoFilterBackend().filter_queryset(request, Product.objects.all(), self)
+        search_filter = ProductSearchFilter()
+        search_filter.rank = False
+        queryset = search_filter.filter_queryset(request, queryset, self)
+        fields = self.get_serializer_class().get_selected_fields(request.query_params)
+
+        filename = f'products.{fmt}' + ('.gz' if compress else '')
+        response = StreamingHttpResponse(
+            export_catalog(queryset, fmt, fields=fields, compress=compress),
+            content_type='application/gzip' if compress else f'{EXPORT_FORMATS[fmt]}; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='bulk_update', permission_classes=[IsAdminUser])
+    def bulk_update(self, request):
+        """
+        Apply many stock/price/discount changes in one transaction.
+        Body is a list of {id, stock | stock_delta, price, discount} rows;
+        the response has one result per row, in order.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {'error': 'Expected a list of updates'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > self.bulk_update_max_rows:
+            return Response(
+                {'error': f'At most {self.bulk_update_max_rows} updates per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        row_serializer = BulkProductUpdateItemSerializer()
+        results = []
+        updates = []
+        for row in rows:
+            try:
+                data = row_serializer.run_validation(row)
+            except serializers.ValidationError as exc:
+                results.append({'id': row.get('id') if isinstance(row, dict) else None,
+                                'status': 'invalid', 'errors': exc.detail})
+                continue
+            results.append({'id': data['id'], 'status': 'pending'})
+            updates.append((len(results) - 1, data))
+
+        with transaction.atomic():
+            current = {
+                product['id']: product
+                for product in Product.objects.select_for_update()
+                .filter(id__in={data['id'] for _, data in updates})
+                .values('id', 'stock', 'price', 'discount')
+            }
+
+            changed = set()
+            for index, data in updates:
+                product = current.get(data['id'])
+                if product is None:
+                    results[index]['status'] = 'not_found'
+                    continue
+
+                stock = data.get('stock', product['stock'] + data.get('stock_delta', 0))
+                if stock < 0:
+                    results[index].update(status='invalid', errors={'stock_delta': ['Stock cannot be negative']})
+                    continue
+
+                # Later rows for the same product build on earlier ones
+                product['stock'] = stock
+                product['price'] = data.get('price', product['price'])
+                product['discount'] = data.get('discount', product['discount'])
+                product['discounted_price'] = compute_discounted_price(product['price'], product['discount'])
+                changed.add(product['id'])
+                results[index].update(
+                    status='updated',
+                    stock=stock,
+                    price=product['price'],
+                    discount=product['discount'],
+                    discounted_price=product['discounted_price'],
+                )
+
+            changed = sorted(changed)
+            now = timezone.now()
+            for start in range(0, len(changed), self.bulk_update_chunk_size):
+                chunk = [current[pk] for pk in changed[start:start + self.bulk_update_chunk_size]]
+                Product.objects.filter(id__in=[product['id'] for product in chunk]).update(
+                    stock=self._case(chunk, 'stock', IntegerField()),
+                    price=self._case(chunk, 'price', DecimalField(max_digits=10, decimal_places=2)),
+                    discount=self._case(chunk, 'discount', DecimalField(max_digits=5, decimal_places=2)),
+                    discounted_price=self._case(
+                        chunk, 'discounted_price', DecimalField(max_digits=10, decimal_places=2)
+                    ),
+                    updated_at=now,
+                )
+
+        if changed:
+            bump_catalog_version()
+
+        # Render decimals the same way ProductSerializer does
+        for result in results:
+            for key in ('price', 'discount', 'discounted_price'):
+                if key in result:
+                    result[key] = f'{result[key]:.2f}'
+
+        return Response({
+            'updated': sum(1 for result in results if result['status'] == 'updated'),
+            'failed': sum(1 for result in results if result['status'] != 'updated'),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _case(products, column, output_field):
+        return Case(
+            *[When(id=product['id'], then=Value(product[column])) for product in products],
+            output_field=output_field,
+        )
@@ -107,6 +107,48 @@ DATABASES = {
 
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='winkit'),
+    }
+}
+
+# Seconds a rendered catalog response is kept, and how long a request may hold
+# the lock while re-rendering one after the catalog version changes
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+CATALOG_CACHE_LOCK_TIMEOUT = config('CATALOG_CACHE_LOCK_TIMEOUT', default=5, cast=int)
+
+# Cart storage backend (cart.store). CacheCartStore keeps working carts in the
+# cache and writes quantity changes back after CART_STORE_FLUSH_INTERVAL
+# seconds, at checkout, or from `manage.py flush_carts`.
+CART_STORE = config('CART_STORE', default='cart.store.DatabaseCartStore')
+CART_STORE_CACHE = config('CART_STORE_CACHE', default='default')
+CART_STORE_TIMEOUT = config('CART_STORE_TIMEOUT', default=86400, cast=int)
+CART_STORE_FLUSH_INTERVAL = config('CART_STORE_FLUSH_INTERVAL', default=60, cast=int)
+CART_STORE_LOCK_TIMEOUT = config('CART_STORE_LOCK_TIMEOUT', default=5, cast=int)
+# CacheCartStore reserves stock in blocks of this many units, so quantity
+# changes within a held block touch only the cache
+CART_STORE_HOLD_BLOCK = config('CART_STORE_HOLD_BLOCK', default=5, cast=int)
+
+# Seconds a cart item keeps its stock reserved after the last change to it;
+# `manage.py expire_reservations` deletes expired holds
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=900, cast=int)
+
+# Seconds an Idempotency-Key on POST /orders/ replays the original response;
+# `manage.py purge_idempotency_keys` deletes expired keys
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+
+# Seconds an unfinished Idempotency-Key request keeps the key; after that a
+# retry takes it over instead of getting 409 (e.g. the worker died mid-request)
+IDEMPOTENCY_KEY_LEASE = config('IDEMPOTENCY_KEY_LEASE', default=60, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -157,7 +199,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
-    # Pagination disabled - all products returned at once
+    # Catalog list endpoints use keyset pagination (products.pagination.KeysetPagination)
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     # 'PAGE_SIZE': 10,
 }